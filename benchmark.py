@@ -0,0 +1,179 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from data_generator import DataGenerator
+from route_metrics import route_metrics, totals
+from route_planner import RoutePlanner
+from solution_validator import validate_solution
+
+# benchmark cases: (name, n_clients, n_vehicles, n_warehouses)
+SUITES = {
+    "quick": [
+        ("1k-5v-1w", 1_000, 5, 1),
+        ("10k-20v-5w", 10_000, 20, 5),
+        ("50k-50v-20w", 50_000, 50, 20),
+    ],
+    "full": [
+        ("1k-5v-1w", 1_000, 5, 1),
+        ("10k-20v-5w", 10_000, 20, 5),
+        ("100k-50v-20w", 100_000, 50, 20),
+        ("100k-500v-200w", 100_000, 500, 200),
+        ("1m-500v-200w", 1_000_000, 500, 200),
+    ],
+}
+PHASES = ("generate", "init", "cluster", "routes", "metrics", "validate")
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+
+def run_case(name, n_clients, n_vehicles, n_warehouses, seed=0, planner_options=None):
+    """
+    Generate one seeded instance and time every planner phase.
+    Peak RSS is sampled after each phase; it never decreases, so a jump shows
+    the phase that set the peak. Meant to run in a fresh process per case.
+    """
+    phases = {}
+    peak_rss = {}
+
+    def timed(phase, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        phases[phase] = time.perf_counter() - start
+        peak_rss[phase] = _peak_rss_mb()
+        return result
+
+    generator = DataGenerator(n_warehouses=n_warehouses, n_clients=n_clients,
+                              n_vehicles=n_vehicles, seed=seed)
+    data = timed("generate", lambda: generator.generate(as_table=True))
+    planner = timed("init", lambda: RoutePlanner(**data, **(planner_options or {})))
+    groups = timed("cluster", planner.cluster)
+    solution = timed("routes", planner.build_routes, groups)
+    metrics = timed("metrics", route_metrics, solution, data["warehouses"], data["clients"],
+                    data["vehicles"])
+    validation = timed("validate", validate_solution, solution, data["warehouses"], planner.clients,
+                       data["vehicles"])
+    total = totals(metrics)
+    return {
+        "case": name,
+        "n_clients": n_clients,
+        "n_vehicles": n_vehicles,
+        "n_warehouses": n_warehouses,
+        "seed": seed,
+        "phases": phases,
+        "total_time": sum(phases.values()),
+        "peak_rss_mb": peak_rss,
+        "distance": total["distance"],
+        "n_reloads": total["n_reloads"],
+        "valid": validation["valid"],
+    }
+
+
+def run_suite(cases, seed=0, repeat=1, planner_options=None):
+    """
+    Run every case `repeat` times, each in its own process so peak memory is
+    per case, and keep the fastest time of every phase.
+    """
+    results = []
+    for name, n_clients, n_vehicles, n_warehouses in cases:
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                runs.append(pool.submit(run_case, name, n_clients, n_vehicles, n_warehouses,
+                                        seed, planner_options).result())
+        best = runs[0]
+        best["phases"] = {phase: min(run["phases"][phase] for run in runs) for phase in PHASES}
+        best["total_time"] = sum(best["phases"].values())
+        results.append(best)
+        print(f"{name}: {best['total_time']:.2f}s "
+              + " ".join(f"{phase}={best['phases'][phase]:.3f}" for phase in PHASES)
+              + f" peak={max(best['peak_rss_mb'].values()):.0f}MB", flush=True)
+    return results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold=0.1, min_seconds=0.05):
+    """
+    Flag regressions against a previous results file: phases slower by more than
+    `threshold` (relative) and `min_seconds` (absolute), peak memory growth beyond
+    `threshold`, longer total route distance for the same seeded instance, and
+    solutions that fail validation.
+    Returns a list of messages; empty means no regression.
+    """
+    previous = {(r["case"], r["seed"]): r for r in baseline["results"]}
+    problems = []
+    for result in results:
+        name = result["case"]
+        if not result["valid"]:
+            problems.append(f"{name}: solution fails validation")
+        old = previous.get((result["case"], result["seed"]))
+        if old is None:
+            continue
+        for phase in PHASES:
+            new_t, old_t = result["phases"][phase], old["phases"].get(phase)
+            if old_t is not None and new_t > old_t * (1 + threshold) and new_t - old_t > min_seconds:
+                problems.append(f"{name}: {phase} {old_t:.3f}s -> {new_t:.3f}s")
+        new_mem = max(result["peak_rss_mb"].values())
+        old_mem = max(old["peak_rss_mb"].values())
+        if new_mem > old_mem * (1 + threshold):
+            problems.append(f"{name}: peak memory {old_mem:.0f}MB -> {new_mem:.0f}MB")
+        if result["distance"] > old["distance"] * (1 + 1e-9):
+            problems.append(f"{name}: distance {old['distance']:.2f} -> {result['distance']:.2f}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time RoutePlanner phases on seeded instances.")
+    parser.add_argument("--suite", choices=sorted(SUITES), default="quick")
+    parser.add_argument("--case", action="append", default=None,
+                        help="run only these cases of the suite (repeatable)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case, fastest is kept")
+    parser.add_argument("--workers", type=int, default=None, help="RoutePlanner n_workers")
+    parser.add_argument("--local-search", action="store_true")
+    parser.add_argument("--balanced", action="store_true")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="results file")
+    parser.add_argument("--compare", default=None, help="baseline results file")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    cases = [case for case in SUITES[args.suite] if args.case is None or case[0] in args.case]
+    options = {"n_workers": args.workers, "local_search": args.local_search,
+               "balanced": args.balanced}
+    results = run_suite(cases, seed=args.seed, repeat=args.repeat, planner_options=options)
+    with open(args.output, "w") as f:
+        json.dump({"environment": environment(), "options": options, "results": results},
+                  f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        problems = compare(results, baseline, args.threshold)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import json
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class ClientTable:
+    """
+    Columnar client store: one row per client, all columns contiguous arrays.
+    """
+
+    _COLUMNS = ("ids", "coords", "demand", "is_pickup")
+
+    def __init__(self, ids, coords, demand, is_pickup, good_types):
+        """
+        ids:        (N,) client IDs
+        coords:     (N, 2) float64 coordinates
+        demand:     (N, G) float64 demand per good type (negative for pickups)
+        is_pickup:  (N,) bool pickup mask
+        good_types: list of G good names, column order of demand
+        """
+        self.ids = np.asarray(ids)
+        self.coords = np.ascontiguousarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.demand = np.ascontiguousarray(demand, dtype=np.float64).reshape(len(self.ids), -1)
+        self.is_pickup = np.ascontiguousarray(is_pickup, dtype=bool)
+        self.good_types = list(good_types)
+        self.good_index = {g: i for i, g in enumerate(self.good_types)}
+        # directory the columns are memory-mapped from, see load()
+        self.path = None
+        self._index = None
+
+    @classmethod
+    def from_records(cls, clients, good_types=None):
+        """
+        Bulk conversion from the legacy list of
+        {'id': int, 'x': float, 'y': float, 'demand': {good: float, ...}, 'is_pickup': bool}.
+        Goods missing from a client's demand dict are stored as 0.
+        """
+        if good_types is None:
+            good_types = list(clients[0]["demand"].keys()) if clients else []
+        ids = np.array([c["id"] for c in clients])
+        coords = np.array([(c["x"], c["y"]) for c in clients], dtype=np.float64)
+        demand = np.array([[c["demand"].get(g, 0.0) for g in good_types] for c in clients],
+                          dtype=np.float64)
+        is_pickup = np.array([c["is_pickup"] for c in clients], dtype=bool)
+        return cls(ids, coords, demand.reshape(len(clients), len(good_types)), is_pickup, good_types)
+
+    def to_records(self):
+        """
+        Inverse of from_records: legacy list of client dicts.
+        """
+        ids = self.ids.tolist()
+        coords = self.coords.tolist()
+        demand = self.demand.tolist()
+        is_pickup = self.is_pickup.tolist()
+        return [
+            {
+                "id": ids[i],
+                "x": coords[i][0],
+                "y": coords[i][1],
+                "demand": dict(zip(self.good_types, demand[i])),
+                "is_pickup": is_pickup[i],
+            }
+            for i in range(len(ids))
+        ]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def index(self):
+        """
+        {client_id: row}, built on first use.
+        """
+        if self._index is None:
+            self._index = {cid: row for row, cid in enumerate(self.ids.tolist())}
+        return self._index
+
+    def row_of(self, cid):
+        return self.index[cid]
+
+    def rows_of(self, cids):
+        index = self.index
+        return np.fromiter((index[cid] for cid in cids), dtype=np.intp, count=len(cids))
+
+    def take(self, rows):
+        """
+        New table holding only the given rows, in the given order.
+        """
+        return ClientTable(self.ids[rows], self.coords[rows], self.demand[rows],
+                           self.is_pickup[rows], self.good_types)
+
+    def append(self, other):
+        """
+        New table with the rows of `other` after these; good types must match.
+        """
+        if other.good_types != self.good_types:
+            raise ValueError(f"good types {other.good_types} != {self.good_types}")
+        table = ClientTable(np.concatenate((self.ids, other.ids)),
+                            np.concatenate((self.coords, other.coords)),
+                            np.concatenate((self.demand, other.demand)),
+                            np.concatenate((self.is_pickup, other.is_pickup)),
+                            self.good_types)
+        if self._index is not None:
+            # extend a built index instead of rebuilding it on first use
+            table._index = dict(self._index)
+            table._index.update((cid, row) for row, cid in enumerate(other.ids.tolist(), len(self)))
+        return table
+
+    def split(self, max_weight):
+        """
+        Table in which every row whose total weight exceeds max_weight is replaced
+        by the fewest equal parts that do not, one row each with the same id and
+        location, in place of the original row.
+        Returns (table, parts): parts (N,) is the number of rows each row became.
+        The table is self when no row needs splitting.
+        """
+        weight = np.abs(self.demand.sum(axis=1))
+        parts = np.maximum(np.ceil(weight / max_weight), 1).astype(np.intp)
+        if (parts == 1).all():
+            return self, parts
+        # rounding can leave a part a hair above max_weight
+        while True:
+            over = np.abs((self.demand / parts[:, None]).sum(axis=1)) > max_weight
+            if not over.any():
+                break
+            parts[over] += 1
+        rows = np.repeat(np.arange(len(self)), parts)
+        table = ClientTable(self.ids[rows], self.coords[rows], self.demand[rows] / parts[rows, None],
+                            self.is_pickup[rows], self.good_types)
+        return table, parts
+
+    def share(self):
+        """
+        Copy the columns into shared memory so other processes can map them
+        instead of unpickling a copy.
+        Returns (blocks, spec): the creating process must keep `blocks` alive and
+        close()/unlink() them when done; `spec` is a small picklable description
+        passed to ClientTable.attach().
+        A table memory-mapped from disk is not copied: other processes map the
+        same files and share their pages.
+        """
+        if self.path is not None:
+            return [], {"path": self.path}
+        blocks = []
+        columns = {}
+        for name in self._COLUMNS:
+            arr = getattr(self, name)
+            if arr.dtype.hasobject or arr.nbytes == 0:
+                # object ids (e.g. strings) and empty columns are passed inline
+                columns[name] = ("inline", arr)
+                continue
+            shm = shared_memory.SharedMemory(create=True, size=arr.nbytes)
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+            blocks.append(shm)
+            columns[name] = ("shm", shm.name, arr.shape, arr.dtype.str)
+        return blocks, {"columns": columns, "good_types": self.good_types}
+
+    @classmethod
+    def attach(cls, spec):
+        """
+        Map a table published with share().
+        Returns (table, blocks); `blocks` must outlive the table.
+        """
+        if "path" in spec:
+            return cls.load(spec["path"]), []
+        blocks = []
+        arrays = {}
+        for name, column in spec["columns"].items():
+            if column[0] == "inline":
+                arrays[name] = column[1]
+                continue
+            _, shm_name, shape, dtype = column
+            shm = shared_memory.SharedMemory(name=shm_name)
+            blocks.append(shm)
+            arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        table = cls(arrays["ids"], arrays["coords"], arrays["demand"], arrays["is_pickup"],
+                    spec["good_types"])
+        return table, blocks
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        """
+        Open a client table directory written by ClientTableWriter.
+        With the default mmap_mode the columns are memory-mapped, not read.
+        """
+        with open(os.path.join(directory, "clients.json")) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+                  for name in cls._COLUMNS}
+        table = cls(arrays["ids"], arrays["coords"], arrays["demand"], arrays["is_pickup"],
+                    meta["good_types"])
+        if mmap_mode is not None:
+            table.path = directory
+        return table
+
+
+class ClientTableWriter:
+    """
+    Writes a client table to a directory, one .npy file per column
+    (ids, coords, demand, is_pickup) plus clients.json with the good types.
+    The row count is fixed up front so every .npy header can be written first;
+    rows are then appended chunk by chunk, so tables larger than RAM can be written.
+    """
+
+    def __init__(self, directory, n_clients, good_types, id_dtype=np.int64):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.n_clients = n_clients
+        self.good_types = list(good_types)
+        shapes = {
+            "ids": ((n_clients,), id_dtype),
+            "coords": ((n_clients, 2), np.float64),
+            "demand": ((n_clients, len(self.good_types)), np.float64),
+            "is_pickup": ((n_clients,), bool),
+        }
+        self.dtypes = {}
+        self.files = {}
+        for name, (shape, dtype) in shapes.items():
+            f = open(os.path.join(directory, f"{name}.npy"), "wb")
+            np.lib.format.write_array_header_1_0(f, {
+                "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                "fortran_order": False,
+                "shape": shape,
+            })
+            self.dtypes[name] = np.dtype(dtype)
+            self.files[name] = f
+        self.written = 0
+
+    def write(self, chunk):
+        """
+        Append the rows of a ClientTable.
+        """
+        if chunk.good_types != self.good_types:
+            raise ValueError(f"chunk good types {chunk.good_types} != {self.good_types}")
+        stop = self.written + len(chunk)
+        if stop > self.n_clients:
+            raise ValueError(f"writing {stop} rows into a table of {self.n_clients}")
+        for name, f in self.files.items():
+            np.ascontiguousarray(getattr(chunk, name), dtype=self.dtypes[name]).tofile(f)
+        self.written = stop
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files.clear()
+        if self.written != self.n_clients:
+            raise ValueError(f"wrote {self.written} of {self.n_clients} rows")
+        with open(os.path.join(self.directory, "clients.json"), "w") as f:
+            json.dump({"good_types": self.good_types, "n_clients": self.n_clients}, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            for f in self.files.values():
+                f.close()
@@ -0,0 +1,141 @@
+import numpy as np
+
+from route_trace import DEPOT, PICKUP, DELIVERY, RELOAD, KIND_NAMES
+
+
+class CompactRoute:
+    """
+    One vehicle route as parallel arrays instead of coordinate tuples.
+
+    stops: (n,) int32 client row (ClientTable) for pickups and deliveries,
+           warehouse position (RoutePlanner.warehouse_ids) for depot and reload stops
+    kinds: (n,) int8 stop kind, the event kinds of route_trace
+    loads: (n,) float64 total load on board after each stop
+    inventory: (k, G) float64 goods on board per good type leaving each of the k
+           depot and reload stops, in route order; None if not recorded
+
+    Coordinates are looked up on demand from the client and warehouse coordinate
+    arrays the route is bound to. Iterating or indexing yields (x, y) tuples and
+    np.asarray(route) gives the (n, 2) coordinates, so code written for the
+    coordinate-list routes keeps working.
+    """
+
+    __slots__ = ("stops", "kinds", "loads", "inventory", "_client_coords", "_warehouse_coords")
+
+    def __init__(self, stops, kinds, loads, client_coords=None, warehouse_coords=None, inventory=None):
+        self.stops = np.asarray(stops, dtype=np.int32)
+        self.kinds = np.asarray(kinds, dtype=np.int8)
+        self.loads = np.asarray(loads, dtype=np.float64)
+        self.inventory = None if inventory is None else np.asarray(inventory, dtype=np.float64)
+        self.bind(client_coords, warehouse_coords)
+
+    def bind(self, client_coords, warehouse_coords):
+        """
+        Attach the coordinate arrays the stop indices refer to. They are not
+        pickled with the route, so routes built in worker processes are bound
+        again by the receiving planner.
+        """
+        self._client_coords = client_coords
+        self._warehouse_coords = warehouse_coords
+        return self
+
+    def __getstate__(self):
+        return self.stops, self.kinds, self.loads, self.inventory
+
+    def __setstate__(self, state):
+        self.stops, self.kinds, self.loads, self.inventory = state
+        self._client_coords = self._warehouse_coords = None
+
+    @property
+    def at_warehouse(self):
+        return (self.kinds == DEPOT) | (self.kinds == RELOAD)
+
+    @property
+    def coords(self):
+        """
+        (n, 2) float64 stop coordinates, computed on every access.
+        """
+        if self._client_coords is None:
+            raise RuntimeError("route is not bound to coordinates, see CompactRoute.bind")
+        at_warehouse = self.at_warehouse
+        xy = np.empty((len(self.stops), 2))
+        xy[at_warehouse] = self._warehouse_coords[self.stops[at_warehouse]]
+        xy[~at_warehouse] = self._client_coords[self.stops[~at_warehouse]]
+        return xy
+
+    def client_rows(self):
+        """
+        Client rows in visiting order.
+        """
+        return self.stops[~self.at_warehouse]
+
+    def length(self):
+        return float(np.hypot(*np.diff(self.coords, axis=0).T).sum())
+
+    @property
+    def nbytes(self):
+        extra = 0 if self.inventory is None else self.inventory.nbytes
+        return self.stops.nbytes + self.kinds.nbytes + self.loads.nbytes + extra
+
+    def __len__(self):
+        return len(self.stops)
+
+    def __iter__(self):
+        return iter(map(tuple, self.coords.tolist()))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [tuple(p) for p in self.coords[i].tolist()]
+        if self._client_coords is None:
+            raise RuntimeError("route is not bound to coordinates, see CompactRoute.bind")
+        # one stop only, so indexed loops over a route stay linear
+        kind = self.kinds[i]
+        xy = self._warehouse_coords if kind == DEPOT or kind == RELOAD else self._client_coords
+        return tuple(xy[self.stops[i]].tolist())
+
+    def __array__(self, dtype=None, copy=None):
+        xy = self.coords
+        return xy if dtype is None else xy.astype(dtype, copy=False)
+
+    def __repr__(self):
+        kinds = ", ".join(f"{KIND_NAMES[k]}:{s}" for k, s in zip(self.kinds.tolist()[:4],
+                                                                 self.stops.tolist()[:4]))
+        more = ", ..." if len(self) > 4 else ""
+        return f"CompactRoute({len(self)} stops: {kinds}{more})"
+
+    @classmethod
+    def from_trips(cls, trips, depot_pos, client_table, warehouse_coords, warehouse_pos):
+        """
+        Route of a vehicle from its trips [[start (x, y), start inventory, [client rows]], ...]
+        as kept by RoutePlanner. The first trip starts at the depot; every later
+        trip starts with a reload at warehouse_pos[start]. The route returns to
+        the depot unless it already ends there.
+        """
+        stops, kinds, loads, inventories = [], [], [], []
+        for i, (start, inventory, rows) in enumerate(trips):
+            rows = np.asarray(rows, dtype=np.intp)
+            load = float(sum(inventory))
+            inventories.append(inventory)
+            stops.append([depot_pos if i == 0 else warehouse_pos[start]])
+            kinds.append([DEPOT if i == 0 else RELOAD])
+            loads.append([load])
+            stops.append(rows)
+            kinds.append(np.where(client_table.is_pickup[rows], PICKUP, DELIVERY))
+            loads.append(load - np.cumsum(client_table.demand[rows].sum(axis=1)))
+        inventories = np.array(inventories, dtype=np.float64).reshape(len(trips), -1)
+        route = cls(np.concatenate(stops), np.concatenate(kinds), np.concatenate(loads),
+                    client_table.coords, warehouse_coords, inventories)
+        last = route.coords[-1]
+        depot = warehouse_coords[depot_pos]
+        if last[0] == depot[0] and last[1] == depot[1]:
+            if len(route) > 1 and route.kinds[-1] == RELOAD:
+                # an empty last trip from the depot is the return to it
+                route.kinds[-1] = DEPOT
+                route.loads[-1] = 0.0
+                route.inventory[-1] = 0.0
+        else:
+            route.stops = np.append(route.stops, np.int32(depot_pos))
+            route.kinds = np.append(route.kinds, np.int8(DEPOT))
+            route.loads = np.append(route.loads, 0.0)
+            route.inventory = np.vstack((route.inventory, np.zeros((1, route.inventory.shape[1]))))
+        return route
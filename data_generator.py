@@ -1,8 +1,15 @@
-import random
+import numpy as np
+
+from client_table import ClientTable, ClientTableWriter
+from instance_io import save_fleet
 
 class DataGenerator:
     """
     Generates warehouses, clients, and vehicles.
+    Warehouses, clients and vehicles are drawn from their own child generators
+    of one seed, so a fixed seed reproduces the instance whatever order the
+    parts are generated in. The client draws still depend on the chunk size
+    they are generated in, see iter_client_tables.
     """
 
     def __init__(self,
@@ -10,7 +17,10 @@ class DataGenerator:
                  n_clients=500,
                  n_vehicles=6,
                  coord_range=(0, 100),
-                 total_demand_range=(100, 200)):
+                 total_demand_range=(100, 200),
+                 seed=None):
+        self.warehouse_rng, self.client_rng, self.vehicle_rng = (
+            np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(3))
         self.n_warehouses = n_warehouses
         self.n_clients = n_clients
         self.n_vehicles = n_vehicles
@@ -28,65 +38,88 @@ class DataGenerator:
         Returns a list of warehouses:
         [{'id': int, 'x': float, 'y': float}, ...]
         """
-        warehouses = []
-        for wid in range(self.n_warehouses):
-            x = random.uniform(self.coord_min, self.coord_max)
-            y = random.uniform(self.coord_min, self.coord_max)
-            warehouses.append({"id": wid, "x": x, "y": y})
-        return warehouses
+        coords = self.warehouse_rng.uniform(self.coord_min, self.coord_max,
+                                            (self.n_warehouses, 2)).tolist()
+        return [{"id": wid, "x": x, "y": y} for wid, (x, y) in enumerate(coords)]
+
+    def _client_chunk(self, first_id, n):
+        rng = self.client_rng
+        coords = rng.uniform(self.coord_min, self.coord_max, (n, 2))
+        totals = rng.uniform(self.demand_min, self.demand_max, n)
+        shares = rng.dirichlet(np.ones(len(self.good_types)), n)
+        is_pickup = rng.random(n) < 0.5
+        demand = shares * totals[:, None]
+        demand[is_pickup] *= -1.0
+        return ClientTable(np.arange(first_id, first_id + n), coords, demand, is_pickup,
+                           self.good_types)
+
+    def generate_client_table(self):
+        """
+        Returns all clients at once as a ClientTable. Each client's total demand
+        is split over the good types by uniform random cuts (a flat Dirichlet
+        split); pickups carry negative demand.
+        """
+        return self._client_chunk(0, self.n_clients)
+
+    def iter_client_tables(self, chunk_size=1_000_000):
+        """
+        Yields the clients as consecutive ClientTable chunks of at most chunk_size
+        rows, so memory stays flat whatever n_clients is.
+        For a given seed the instance depends on chunk_size.
+        """
+        for start in range(0, self.n_clients, chunk_size):
+            yield self._client_chunk(start, min(chunk_size, self.n_clients - start))
+
+    def write_clients(self, directory, chunk_size=1_000_000):
+        """
+        Streams the clients chunk by chunk into a client table directory
+        (see ClientTableWriter) without holding them in memory.
+        """
+        with ClientTableWriter(directory, self.n_clients, self.good_types) as writer:
+            for chunk in self.iter_client_tables(chunk_size):
+                writer.write(chunk)
+
+    def write_instance(self, directory, chunk_size=1_000_000):
+        """
+        Streams a whole instance (clients, warehouses, vehicles) into an
+        instance directory readable by instance_io.load_instance.
+        """
+        self.write_clients(directory, chunk_size)
+        save_fleet(directory, self.generate_warehouses(), self.generate_vehicles(),
+                   self.n_clients, self.good_types)
 
     def generate_clients(self):
         """
         Returns a list of clients:
         [{'id': int, 'x': float, 'y': float, 'demand': {good: float, ...}, 'is_pickup': bool}, ...]
         """
-        clients = []
-        for cid in range(self.n_clients):
-            x = random.uniform(self.coord_min, self.coord_max)
-            y = random.uniform(self.coord_min, self.coord_max)
-            total = random.uniform(self.demand_min, self.demand_max)
-            cuts = sorted([random.uniform(0, total) for _ in range(len(self.good_types) - 1)])
-            parts = []
-            prev = 0.0
-            for cut in cuts:
-                parts.append(cut - prev)
-                prev = cut
-            parts.append(total - prev)
-            demand_vector = {self.good_types[i]: parts[i] for i in range(len(self.good_types))}
-            is_pickup = random.choice([True, False])
-            if is_pickup:
-                demand_vector = {g: -amt for g, amt in demand_vector.items()}
-            clients.append({
-                "id": cid,
-                "x": x,
-                "y": y,
-                "demand": demand_vector,
-                "is_pickup": is_pickup
-            })
-        return clients
+        return self.generate_client_table().to_records()
 
     def generate_vehicles(self):
         """
         Returns a list of vehicles:
         [{'id': int, 'type': str, 'capacity': float, 'warehouse_id': int}, ...]
         """
+        types = self.vehicle_rng.integers(len(self.vehicle_types), size=self.n_vehicles).tolist()
+        homes = self.vehicle_rng.integers(self.n_warehouses, size=self.n_vehicles).tolist()
         vehicles = []
         for vid in range(self.n_vehicles):
-            vt = random.choice(self.vehicle_types)
+            vt = self.vehicle_types[types[vid]]
             vehicles.append({
                 "id": vid,
                 "type": vt["type"],
                 "capacity": vt["capacity"],
-                "warehouse_id": random.randrange(self.n_warehouses)
+                "warehouse_id": homes[vid]
             })
         return vehicles
 
-    def generate(self):
+    def generate(self, as_table=False):
         """
-        Returns dict with keys 'warehouses', 'clients', 'vehicles'
+        Returns dict with keys 'warehouses', 'clients', 'vehicles'.
+        With as_table=True, 'clients' is a ClientTable instead of a list of dicts.
         """
         return {
             "warehouses": self.generate_warehouses(),
-            "clients": self.generate_clients(),
+            "clients": self.generate_client_table() if as_table else self.generate_clients(),
             "vehicles": self.generate_vehicles()
         }
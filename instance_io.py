@@ -0,0 +1,106 @@
+import json
+import os
+
+import numpy as np
+
+from client_table import ClientTable, ClientTableWriter
+from stock_ledger import StockLedger
+
+FORMAT_NAME = "delivery-optimizer-instance"
+FORMAT_VERSION = 1
+
+
+def save_instance(directory, warehouses, clients, vehicles):
+    """
+    Write an instance as a directory of .npy columns:
+
+        instance.json          format header, counts and good types
+        ids.npy, coords.npy,   client table (see ClientTableWriter)
+        demand.npy, is_pickup.npy, clients.json
+        warehouse_ids.npy      (W,) warehouse IDs
+        warehouse_coords.npy   (W, 2) float64
+        warehouse_stock.npy    (W, G) float64, only if warehouses model stock,
+        warehouse_storage.npy  (W, G) float64  inf where unlimited (see StockLedger)
+        vehicle_ids.npy        (V,) vehicle IDs
+        vehicle_types.npy      (V,) str
+        vehicle_capacity.npy   (V,) float64
+        vehicle_warehouse.npy  (V,) home warehouse IDs
+
+    clients: ClientTable or the legacy list of client dicts
+    """
+    if not isinstance(clients, ClientTable):
+        clients = ClientTable.from_records(clients)
+    with ClientTableWriter(directory, len(clients), clients.good_types,
+                           id_dtype=clients.ids.dtype) as writer:
+        writer.write(clients)
+    save_fleet(directory, warehouses, vehicles, len(clients), clients.good_types)
+
+
+def save_fleet(directory, warehouses, vehicles, n_clients, good_types):
+    """
+    Write the warehouse and vehicle tables and the instance header next to a
+    client table that is already in `directory` (e.g. streamed by ClientTableWriter).
+    """
+    columns = {
+        "warehouse_ids": np.array([w["id"] for w in warehouses]),
+        "warehouse_coords": np.array([(w["x"], w["y"]) for w in warehouses],
+                                     dtype=np.float64).reshape(-1, 2),
+        "vehicle_ids": np.array([v["id"] for v in vehicles]),
+        "vehicle_types": np.array([v["type"] for v in vehicles], dtype=str),
+        "vehicle_capacity": np.array([v["capacity"] for v in vehicles], dtype=np.float64),
+        "vehicle_warehouse": np.array([v["warehouse_id"] for v in vehicles]),
+    }
+    ledger = StockLedger.from_warehouses(warehouses, good_types)
+    if ledger is not None:
+        columns["warehouse_stock"] = ledger.stock
+        columns["warehouse_storage"] = ledger.storage
+    for name, arr in columns.items():
+        np.save(os.path.join(directory, f"{name}.npy"), arr)
+    header = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "n_clients": n_clients,
+        "n_warehouses": len(warehouses),
+        "n_vehicles": len(vehicles),
+        "good_types": list(good_types),
+    }
+    with open(os.path.join(directory, "instance.json"), "w") as f:
+        json.dump(header, f, indent=2)
+
+
+def load_instance(directory, mmap_mode="r"):
+    """
+    Open an instance written by save_instance.
+    Client columns are memory-mapped (unless mmap_mode is None), so opening is
+    independent of the client count and processes mapping the same files share
+    their pages. Warehouses and vehicles are small and returned as lists of dicts.
+    Returns {'warehouses': [...], 'clients': ClientTable, 'vehicles': [...]},
+    ready for RoutePlanner(**instance).
+    """
+    with open(os.path.join(directory, "instance.json")) as f:
+        header = json.load(f)
+    if header.get("format") != FORMAT_NAME or header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{directory}: not a version {FORMAT_VERSION} instance directory")
+
+    def column(name):
+        return np.load(os.path.join(directory, f"{name}.npy"))
+
+    clients = ClientTable.load(directory, mmap_mode=mmap_mode)
+    if len(clients) != header["n_clients"]:
+        raise ValueError(f"{directory}: header says {header['n_clients']} clients, "
+                         f"found {len(clients)}")
+    wh_coords = column("warehouse_coords").tolist()
+    warehouses = [{"id": wid, "x": x, "y": y}
+                  for wid, (x, y) in zip(column("warehouse_ids").tolist(), wh_coords)]
+    if os.path.isfile(os.path.join(directory, "warehouse_stock.npy")):
+        good_types = header["good_types"]
+        for wh, stock, storage in zip(warehouses, column("warehouse_stock").tolist(),
+                                      column("warehouse_storage").tolist()):
+            wh["stock"] = dict(zip(good_types, stock))
+            wh["storage"] = dict(zip(good_types, storage))
+    vehicles = [{"id": vid, "type": vtype, "capacity": cap, "warehouse_id": wid}
+                for vid, vtype, cap, wid in zip(column("vehicle_ids").tolist(),
+                                                column("vehicle_types").tolist(),
+                                                column("vehicle_capacity").tolist(),
+                                                column("vehicle_warehouse").tolist())]
+    return {"warehouses": warehouses, "clients": clients, "vehicles": vehicles}
@@ -0,0 +1,148 @@
+import math
+import time
+
+import numpy as np
+
+from spatial_index import GridIndex
+
+
+def improve_trip(stops, coords, demand, start_inventory, capacity, start, end,
+                 n_neighbours=8, deadline=None):
+    """
+    Shorten one trip (the clients visited between two warehouse stops) with
+    2-opt and Or-opt moves, keeping both warehouse endpoints fixed.
+
+    stops:           client rows in visiting order
+    coords:          (N, 2) client coordinates
+    demand:          (N, G) signed client demand (negative for pickups)
+    start_inventory: (G,) load when leaving the start warehouse
+    capacity:        vehicle capacity
+    start, end:      (x, y) of the trip's warehouses
+    n_neighbours:    candidate moves per client are limited to its nearest clients
+    deadline:        time.perf_counter() value after which the search stops
+
+    A move is kept only if it shortens the trip and the inventory stays
+    feasible at every stop: no good below zero and total load within capacity.
+    Returns the improved list of client rows.
+    """
+    m = len(stops)
+    if m < 2:
+        return list(stops)
+    rows = np.asarray(stops, dtype=np.intp)
+    pts = np.vstack((coords[rows], start, end)).tolist()
+    loads = demand[rows]
+    start_inventory = np.asarray(start_inventory, dtype=np.float64)
+    tol = 1e-9 * max(capacity, 1.0)
+
+    def dist(a, b):
+        pa, pb = pts[a], pts[b]
+        return math.hypot(pa[0] - pb[0], pa[1] - pb[1])
+
+    # local nodes: 0..m-1 clients, m start warehouse, m + 1 end warehouse
+    seq = [m] + list(range(m)) + [m + 1]
+    pos = list(range(1, m + 1)) + [0, m + 1]
+    neighbours = _neighbour_lists(coords[rows], n_neighbours)
+    # inventory after each position of seq
+    inventory = np.empty((m + 2, len(start_inventory)))
+    inventory[0] = start_inventory
+    inventory[1:m + 1] = start_inventory - np.cumsum(loads, axis=0)
+    inventory[m + 1] = inventory[m]
+
+    def profile(new_seq, lo, hi):
+        # a move only reorders positions lo..hi - 1, so only they need replaying
+        return inventory[lo - 1] - np.cumsum(loads[new_seq[lo:hi]], axis=0)
+
+    def feasible(new_seq, lo, hi):
+        inv = profile(new_seq, lo, hi)
+        return inv.min() >= -tol and inv.sum(axis=1).max() <= capacity + tol
+
+    def commit(new_seq, lo, hi):
+        inventory[lo:hi] = profile(new_seq, lo, hi)
+        seq[:] = new_seq
+        for p in range(lo, hi):
+            pos[seq[p]] = p
+
+    improved = True
+    while improved:
+        improved = False
+        for a in range(m):
+            if deadline is not None and time.perf_counter() > deadline:
+                return rows[seq[1:-1]].tolist()
+            if _two_opt(a, neighbours[a], seq, pos, dist, feasible, commit, tol):
+                improved = True
+                continue
+            for length in (1, 2, 3):
+                if _or_opt(a, length, neighbours, seq, pos, dist, feasible, commit, tol):
+                    improved = True
+                    break
+    return rows[seq[1:-1]].tolist()
+
+
+def _neighbour_lists(points, k):
+    """
+    For every point, the positions of its k nearest other points.
+    """
+    index = GridIndex(points)
+    xy = points.tolist()
+    return [[key for _, key in index.nearest(x, y, k + 1) if key != i][:k]
+            for i, (x, y) in enumerate(xy)]
+
+
+def _two_opt(a, candidates, seq, pos, dist, feasible, commit, tol):
+    """
+    Try adding edge (a, b) for each neighbour b by reversing the path between them.
+    """
+    for b in candidates:
+        i, j = pos[a], pos[b]
+        if i > j:
+            i, j = j, i
+        # new edges (seq[i], seq[j]) and (seq[i + 1], seq[j + 1])
+        if j - i < 2:
+            continue
+        p, q, r, s = seq[i], seq[i + 1], seq[j], seq[j + 1]
+        delta = dist(p, r) + dist(q, s) - dist(p, q) - dist(r, s)
+        if delta < -tol:
+            new_seq = seq[:i + 1] + seq[j:i:-1] + seq[j + 1:]
+            if feasible(new_seq, i + 1, j + 1):
+                commit(new_seq, i + 1, j + 1)
+                return True
+    return False
+
+
+def _or_opt(a, length, neighbours, seq, pos, dist, feasible, commit, tol):
+    """
+    Try moving the chain of `length` clients starting at a next to one of the
+    neighbours of its end clients, in either orientation.
+    """
+    i = pos[a]
+    if i + length > len(seq) - 1:
+        # chain would run into the end warehouse
+        return False
+    chain = seq[i:i + length]
+    head, tail = chain[0], chain[-1]
+    prev, nxt = seq[i - 1], seq[i + length]
+    in_chain = set(chain)
+    removal_gain = dist(prev, head) + dist(tail, nxt) - dist(prev, nxt)
+    if removal_gain <= tol:
+        return False
+    for c in set(neighbours[head]) | set(neighbours[tail]):
+        if c in in_chain:
+            continue
+        j = pos[c]
+        for u, v in ((seq[j - 1], c), (c, seq[j + 1])):
+            if u in in_chain or v in in_chain:
+                continue
+            base = dist(u, v)
+            forward = dist(u, head) + dist(tail, v) - base
+            backward = dist(u, tail) + dist(head, v) - base
+            insert_cost, ordered = ((forward, chain) if forward <= backward
+                                    else (backward, chain[::-1]))
+            if insert_cost - removal_gain < -tol:
+                rest = seq[:i] + seq[i + length:]
+                k = rest.index(u) + 1
+                new_seq = rest[:k] + ordered + rest[k:]
+                lo, hi = min(i, k), max(i, k) + length
+                if feasible(new_seq, lo, hi):
+                    commit(new_seq, lo, hi)
+                    return True
+    return False
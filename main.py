@@ -1,26 +1,178 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from data_generator import DataGenerator
+from instance_io import load_instance
+from route_metrics import route_metrics, summary_table, totals
 from route_planner import RoutePlanner
-from visualisation import plot_solution
-import math
+from solution_validator import validate_solution
+from utils import to_json, write_solution
+import argparse
+import logging
+import os
+import time
 
-def main():
-    generator = DataGenerator()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Plan delivery routes. Without instances, a random instance is "
+                    "generated and plotted in a window.")
+    parser.add_argument("instances", nargs="*",
+                        help="instance directories (see instance_io), or directories "
+                             "holding several of them")
+    parser.add_argument("-o", "--output", default="results",
+                        help="output directory; each instance gets a subdirectory (default: results)")
+    parser.add_argument("--engine", choices=("greedy", "ortools"), default="greedy")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes used inside the engine for one instance")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="instances solved at the same time")
+    parser.add_argument("--max-iters", type=int, default=10, help="Voronoi clustering iterations")
+    parser.add_argument("--tol", type=float, default=1e-2, help="Voronoi convergence tolerance")
+    parser.add_argument("--balanced", action="store_true",
+                        help="balance the demand of each vehicle's clients against its capacity")
+    parser.add_argument("--local-search", action="store_true",
+                        help="greedy engine: improve routes with 2-opt / Or-opt")
+    parser.add_argument("--local-search-budget", type=float, default=1.0,
+                        help="greedy engine: local search seconds per vehicle")
+    parser.add_argument("--time-limit", type=float, default=10.0,
+                        help="ortools engine: solver seconds per vehicle cluster")
+    parser.add_argument("--format", choices=("ndjson", "json"), default="ndjson",
+                        help="solution file format")
+    parser.add_argument("--plot", choices=("png", "svg"), default=None,
+                        help="also render the solution headlessly in this format")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed of the random instance used when no instance is given")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log planner progress")
+    return parser.parse_args(argv)
+
+
+def find_instances(paths):
+    """
+    Expand the command-line paths into instance directories.
+    """
+    found = []
+    for path in paths:
+        if os.path.isfile(os.path.join(path, "instance.json")):
+            found.append(path)
+            continue
+        if not os.path.isdir(path):
+            raise SystemExit(f"{path}: not an instance directory")
+        nested = sorted(os.path.join(path, name) for name in os.listdir(path)
+                        if os.path.isfile(os.path.join(path, name, "instance.json")))
+        if not nested:
+            raise SystemExit(f"{path}: no instances found")
+        found.extend(nested)
+    return found
+
+
+def solve(instance, args):
+    """
+    Run the selected engine on an instance dict.
+    Returns (solution, the RoutePlanner that planned it); the planner's clients
+    are the rows the routes refer to, see RoutePlanner.split_clients.
+    """
+    if args.engine == "ortools":
+        # OR-Tools is only needed for this engine
+        from ortools_planner import ORToolsPlanner
+        planner = ORToolsPlanner(**instance, time_limit=args.time_limit, n_workers=args.workers,
+                                 max_iters=args.max_iters, tol=args.tol, balanced=args.balanced)
+        return planner.plan_routes(), planner.planner
+    else:
+        planner = RoutePlanner(**instance, max_iters=args.max_iters, tol=args.tol,
+                               n_workers=args.workers, local_search=args.local_search,
+                               local_search_budget=args.local_search_budget,
+                               balanced=args.balanced)
+    return planner.plan_routes(), planner
+
+
+def run_instance(path, args):
+    """
+    Solve one instance directory and write solution, metrics and the optional
+    plot to args.output/<instance name>/.
+    Returns (path, wall time in seconds, fleet totals).
+    """
+    start = time.perf_counter()
+    instance = load_instance(path)
+    solution, planner = solve(instance, args)
+    metrics = route_metrics(solution, **instance)
+    total = totals(metrics)
+    validation = validate_solution(solution, instance["warehouses"], planner.clients,
+                                   instance["vehicles"])
+    if not validation["valid"]:
+        logging.warning(f"{path}: invalid solution, {validation['n_unserved']} unserved, "
+                        f"{validation['n_double_served']} double-served, "
+                        f"{validation['n_capacity_violations']} over capacity, "
+                        f"{validation['n_negative_inventory']} short trips")
+    wall_time = time.perf_counter() - start
+
+    out_dir = os.path.join(args.output, os.path.basename(os.path.normpath(path)))
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, f"solution.{args.format}"), "w") as f:
+        write_solution(solution, f, args.format)
+    with open(os.path.join(out_dir, "metrics.json"), "w") as f:
+        f.write(to_json({
+            "instance": path,
+            "engine": args.engine,
+            "wall_time": wall_time,
+            "totals": total,
+            "split_clients": {str(cid): parts for cid, parts in planner.split_clients.items()},
+            "validation": validation,
+            "vehicles": {str(vid): m for vid, m in metrics.items()},
+        }))
+    if args.plot:
+        from visualisation import plot_solution
+        plot_solution(instance["warehouses"], instance["vehicles"], solution,
+                      path=os.path.join(out_dir, f"solution.{args.plot}"))
+    return path, wall_time, total
+
+
+def _init_job(verbose):
+    logging.basicConfig(
+        level=logging.INFO if verbose else logging.WARNING,
+        format="%(asctime)s %(levelname)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+
+def run_batch(paths, args):
+    """
+    Solve every instance, args.jobs at a time, reporting each wall time as it finishes.
+    """
+    if args.jobs > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(paths)), initializer=_init_job,
+                                 initargs=(args.verbose,)) as pool:
+            futures = [pool.submit(run_instance, path, args) for path in paths]
+            for future in as_completed(futures):
+                report(*future.result())
+    else:
+        for path in paths:
+            report(*run_instance(path, args))
+
+
+def report(path, wall_time, total):
+    print(f"{path}: {wall_time:.2f}s, distance {total['distance']:.2f}, "
+          f"{total['n_stops']} stops, {total['n_reloads']} reloads", flush=True)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.instances:
+        _init_job(args.verbose)
+        run_batch(find_instances(args.instances), args)
+        return
+
+    _init_job(True)
+    generator = DataGenerator(seed=args.seed)
     data = generator.generate()
     warehouses = data["warehouses"]
     clients = data["clients"]
     vehicles = data["vehicles"]
 
-    planner = RoutePlanner(warehouses, clients, vehicles)
-    solution = planner.plan_routes()
+    solution, _ = solve(data, args)
 
-    for vid, route in solution.items():
-        total_length = 0.0
-        for i in range(len(route) - 1):
-            x1, y1 = route[i]
-            x2, y2 = route[i + 1]
-            total_length += math.hypot(x2 - x1, y2 - y1)
-        print(f"Vehicle {vid} total route length: {total_length:.2f}")
+    metrics = route_metrics(solution, warehouses, clients, vehicles)
+    print(summary_table(metrics))
 
+    from visualisation import plot_solution
     plot_solution(warehouses, vehicles, solution)
 
 if __name__ == "__main__":
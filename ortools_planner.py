@@ -0,0 +1,271 @@
+import logging
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+
+from route_planner import RoutePlanner
+from route_repair import min_start_inventory
+
+logger = logging.getLogger(__name__)
+
+
+class ORToolsPlanner:
+    """
+    Alternative engine to RoutePlanner.plan_routes: clients are split into Voronoi
+    clusters exactly like RoutePlanner does, then every cluster is solved as a
+    capacitated pickup-and-delivery problem with the OR-Tools routing solver,
+    starting from the greedy route.
+    """
+
+    def __init__(self, warehouses, clients, vehicles, time_limit=10.0, n_workers=None,
+                 max_iters=10, tol=1e-2, spare_reloads=2, distance_scale=1000, weight_scale=100,
+                 balanced=False, split_orders=True):
+        """
+        warehouses, clients, vehicles: same input as RoutePlanner
+        time_limit:     wall-clock seconds the solver may spend on each cluster
+        n_workers:      if > 1, solve clusters in a pool of that many processes
+        max_iters, tol: Voronoi clustering parameters, see RoutePlanner
+        spare_reloads:  reload stops offered at every warehouse beyond those the greedy used
+        distance_scale: distances are rounded to 1/distance_scale for the solver
+        weight_scale:   weights are rounded up to 1/weight_scale, capacities down
+        balanced:       capacity-balanced clusters, see RoutePlanner
+        split_orders:   split orders heavier than any vehicle, see RoutePlanner
+        """
+        self.planner = RoutePlanner(warehouses, clients, vehicles, max_iters=max_iters, tol=tol,
+                                    balanced=balanced, split_orders=split_orders)
+        self.time_limit = time_limit
+        self.n_workers = n_workers
+        self.spare_reloads = spare_reloads
+        self.distance_scale = distance_scale
+        self.weight_scale = weight_scale
+
+    def cluster_problems(self):
+        """
+        One independent subproblem per vehicle: its Voronoi cluster of clients.
+        Reload stops are offered at the home warehouse and at every warehouse the
+        greedy route reloads at, and the greedy route is the initial solution. The
+        greedy trips are kept in planner.vehicle_trips for clusters the solver fails on,
+        and the stock they book in self.greedy_stock {vehicle_id: (W, G) stock taken}.
+        Returns [(vehicle_id, client_rows, reload warehouse positions, solve_cluster kwargs), ...]
+        """
+        planner = self.planner
+        ledger = planner.ledger
+        if ledger is not None:
+            ledger.reset()
+        self.greedy_stock = {}
+        wh_pos = {loc: w for w, loc in enumerate(planner.warehouse_locs)}
+        problems = []
+        groups = planner.cluster()
+        # cluster() may drop cancelled clients, so the table is read after it
+        clients = planner.clients
+        # vehicle position per client row, as RoutePlanner.build_routes keeps it
+        planner.labels = np.full(len(clients), -1, dtype=np.intp)
+        for v, (vid, rows) in enumerate(zip(planner.vehicle_ids, groups)):
+            planner.labels[rows] = v
+            depot = tuple(planner.warehouses[planner.wh_map[vid]])
+            before = ledger.stock.copy() if ledger is not None else None
+            trips = planner._build_trips(vid, depot, rows)
+            if ledger is not None:
+                # unlimited goods stay unlimited: nothing to give back
+                self.greedy_stock[vid] = np.subtract(before, ledger.stock, where=np.isfinite(before),
+                                                     out=np.zeros_like(before))
+            # booked in the stock ledger already, so the fallback must not build them again
+            planner.vehicle_trips[vid] = [[start, inventory, rows[stops].tolist()]
+                                          for start, inventory, stops in trips]
+            used = [wh_pos[start] for start, _, _ in trips[1:]]
+            # reload copies per site: as many as the greedy used plus some spare
+            reloads = []
+            copies = {}
+            for w in sorted(set(used) | {wh_pos[depot]}):
+                n_copies = used.count(w) + self.spare_reloads
+                copies[w] = list(range(len(reloads), len(reloads) + n_copies))
+                reloads.extend([w] * n_copies)
+            initial_route = list(trips[0][2])
+            for start, _, stops in trips[1:]:
+                initial_route.append(-1 - copies[wh_pos[start]].pop(0))
+                initial_route.extend(stops)
+            problems.append((vid, rows, reloads, {
+                "depot": depot,
+                "coords": clients.coords[rows],
+                "demand": clients.demand[rows],
+                "capacity": planner.capacities[vid],
+                "reload_coords": planner.warehouse_coords[reloads].reshape(-1, 2),
+                "initial_route": initial_route,
+                "time_limit": self.time_limit,
+                "distance_scale": self.distance_scale,
+                "weight_scale": self.weight_scale,
+            }))
+        return problems
+
+    def plan_routes(self):
+        """
+        Solve every cluster, in parallel if n_workers > 1.
+        Clusters without a solver solution fall back to the greedy route. With
+        warehouse stock, a solver route replaces the greedy one in the ledger only
+        if its loads and unloads fit; otherwise the greedy route is kept too.
+        Returns {vehicle_id: CompactRoute, ...}
+        """
+        planner = self.planner
+        problems = self.cluster_problems()
+        kwargs = [problem for _, _, _, problem in problems]
+        if self.n_workers and self.n_workers > 1 and len(problems) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.n_workers, len(problems))) as pool:
+                visits = list(pool.map(_solve_cluster_kwargs, kwargs))
+        else:
+            visits = [solve_cluster_visits(**problem) for problem in kwargs]
+
+        solution = {}
+        for (vid, rows, reloads, problem), visit in zip(problems, visits):
+            if visit is None:
+                logger.warning(f"Vehicle {vid}: no OR-Tools solution for {len(rows)} clients, using greedy route")
+                solution[vid] = planner._trips_to_route(vid)
+                continue
+            # solver visits to trips; reloads with nothing after them are dropped
+            demand = planner.clients.demand
+            depot = tuple(problem["depot"])
+            trips = [[depot, None, []]]
+            for k in visit:
+                if k >= 0:
+                    trips[-1][2].append(int(rows[k]))
+                else:
+                    loc = planner.warehouse_locs[reloads[-1 - k]]
+                    if not trips[-1][2]:
+                        if len(trips) > 1:
+                            trips.pop()
+                        elif loc == depot:
+                            # a reload at the depot before any client is the depot start
+                            continue
+                    trips.append([loc, None, []])
+            if len(trips) > 1 and not trips[-1][2]:
+                trips.pop()
+            for trip in trips:
+                trip[1] = min_start_inventory(demand[trip[2]]).tolist()
+            ledger = planner.ledger
+            if ledger is not None:
+                # swap the greedy bookings for the solver route's
+                ledger.stock += self.greedy_stock[vid]
+                if not planner._book_trips(vid, trips):
+                    ledger.stock -= self.greedy_stock[vid]
+                    logger.warning(f"Vehicle {vid}: OR-Tools route exceeds warehouse stock or "
+                                   f"storage, using greedy route")
+                    solution[vid] = planner._trips_to_route(vid)
+                    continue
+            planner.vehicle_trips[vid] = trips
+            planner.stats.vehicle(vid)["reloads"] = len(trips) - 1
+            solution[vid] = planner._trips_to_route(vid)
+        # kept for incremental updates through the planner, as after RoutePlanner.plan_routes
+        planner.solution = solution
+        return dict(solution)
+
+
+def solve_cluster(depot, coords, demand, capacity, reload_coords, initial_route=None,
+                  time_limit=10.0, distance_scale=1000, weight_scale=100):
+    """
+    solve_cluster_visits, as coordinates.
+    Returns [(x, y), ...] from depot to depot, or None if no solution was found.
+    """
+    visits = solve_cluster_visits(depot, coords, demand, capacity, reload_coords, initial_route,
+                                  time_limit, distance_scale, weight_scale)
+    if visits is None:
+        return None
+    route = [tuple(depot)]
+    for k in visits:
+        loc = tuple(coords[k]) if k >= 0 else tuple(reload_coords[-1 - k])
+        if route[-1] != loc:
+            route.append(loc)
+    if route[-1] != tuple(depot):
+        route.append(tuple(depot))
+    return route
+
+
+def solve_cluster_visits(depot, coords, demand, capacity, reload_coords, initial_route=None,
+                         time_limit=10.0, distance_scale=1000, weight_scale=100):
+    """
+    Single-vehicle multi-good pickup-and-delivery model with optional reload stops.
+
+    depot:         (x, y) warehouse where the route starts and ends
+    coords:        (m, 2) client coordinates
+    demand:        (m, G) signed demand per good (negative for pickups)
+    capacity:      vehicle capacity
+    reload_coords: (R, 2) optional reload stops; list a warehouse several times
+                   to allow several reloads there
+    initial_route: optional starting solution: client positions, with -1 - r
+                   for reload stop r (e.g. the greedy route)
+
+    Same rules as RoutePlanner: the vehicle leaves the depot with any load, picked-up
+    goods can be delivered further on, no good may go below zero, the total load
+    stays within capacity, and at a reload stop the load can be changed freely.
+    Each good is a dimension whose cumul is the amount on board; reload stops get
+    slack so the cumul can move anywhere in [0, capacity] there.
+    Returns the visits between leaving and reaching the depot, encoded like
+    initial_route, or None if no solution was found.
+    """
+    m = len(coords)
+    if m == 0:
+        return []
+    n_reloads = len(reload_coords)
+    # nodes: 0 depot, 1..m clients, m+1..m+R reload stops
+    points = np.vstack((np.reshape(depot, (1, 2)), coords, np.reshape(reload_coords, (-1, 2))))
+    diff = points[:, None, :] - points[None, :, :]
+    dist = np.rint(np.hypot(diff[..., 0], diff[..., 1]) * distance_scale).astype(np.int64).tolist()
+    # amounts are rounded away from zero so the rounded model stays conservative
+    change = -np.sign(demand) * np.ceil(np.abs(demand) * weight_scale)
+    cap = int(math.floor(capacity * weight_scale))
+    n_nodes = 1 + m + n_reloads
+
+    manager = pywrapcp.RoutingIndexManager(n_nodes, 1, 0)
+    routing = pywrapcp.RoutingModel(manager)
+    # matrix and vector transits are evaluated in C++, without Python callbacks
+    transit = routing.RegisterTransitMatrix(dist)
+    routing.SetArcCostEvaluatorOfAllVehicles(transit)
+
+    def add_load_dimension(node_change, name):
+        # leaving a reload stop costs -cap and the slack in [0, 2 cap] buys any new load
+        values = [0] + [int(v) for v in node_change] + [-cap] * n_reloads
+        routing.AddDimension(routing.RegisterUnaryTransitVector(values), 2 * cap, cap, False, name)
+        dim = routing.GetDimensionOrDie(name)
+        for node in range(m + 1):
+            dim.SlackVar(manager.NodeToIndex(node)).SetValue(0)
+        return dim
+
+    goods = [add_load_dimension(change[:, g], f"good_{g}") for g in range(change.shape[1])]
+    total = add_load_dimension(change.sum(axis=1), "total")
+    solver = routing.solver()
+    indices = [manager.NodeToIndex(node) for node in range(n_nodes)] + [routing.End(0)]
+    for index in indices:
+        solver.Add(total.CumulVar(index) == solver.Sum([dim.CumulVar(index) for dim in goods]))
+    for node in range(m + 1, n_nodes):
+        routing.AddDisjunction([manager.NodeToIndex(node)], 0)
+
+    params = pywrapcp.DefaultRoutingSearchParameters()
+    params.first_solution_strategy = (
+        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
+    params.local_search_metaheuristic = (
+        routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH)
+    params.time_limit.FromMilliseconds(int(time_limit * 1000))
+
+    assignment = None
+    if initial_route is not None:
+        routing.CloseModelWithParameters(params)
+        seed = [k + 1 if k >= 0 else m + (-1 - k) + 1 for k in initial_route]
+        initial = routing.ReadAssignmentFromRoutes([seed], True)
+        if initial is not None:
+            assignment = routing.SolveFromAssignmentWithParameters(initial, params)
+    if assignment is None:
+        assignment = routing.SolveWithParameters(params)
+    if assignment is None:
+        return None
+
+    visits = []
+    index = assignment.Value(routing.NextVar(routing.Start(0)))
+    while not routing.IsEnd(index):
+        node = manager.IndexToNode(index)
+        visits.append(node - 1 if node <= m else -1 - (node - m - 1))
+        index = assignment.Value(routing.NextVar(index))
+    return visits
+
+
+def _solve_cluster_kwargs(kwargs):
+    return solve_cluster_visits(**kwargs)
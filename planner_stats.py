@@ -0,0 +1,104 @@
+from collections import defaultdict
+
+# per-vehicle counters, with their Prometheus help texts
+VEHICLE_METRICS = {
+    "clients": "Clients assigned to the vehicle.",
+    "feasibility_checks": "Candidate clients tested against the vehicle load while building the route.",
+    "reloads": "Warehouse reloads in the greedy route.",
+    "unserved": "Clients left unserved because no warehouse could supply or store their goods.",
+    "route_length": "Length of the final route.",
+    "build_seconds": "Wall time spent building the route.",
+    "local_search_seconds": "Wall time spent in local search on the route.",
+}
+
+
+class PlannerStats:
+    """
+    Counters and timings filled in by RoutePlanner.plan_routes; read them from
+    planner.stats after the call.
+
+    phases:     {phase: seconds}, e.g. 'cluster', 'routes'
+    iterations: Voronoi iterations run by the last cluster()
+    balance_iterations: capacity-balanced iterations run after them
+    shift:      center shift of the last clustering iteration
+    vehicles:   {vehicle_id: {counter: value}}, see VEHICLE_METRICS
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.iterations = 0
+        self.balance_iterations = 0
+        self.shift = None
+        self.vehicles = defaultdict(dict)
+
+    def reset(self):
+        self.phases.clear()
+        self.iterations = 0
+        self.balance_iterations = 0
+        self.shift = None
+        self.vehicles.clear()
+
+    def add_phase(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def vehicle(self, vid):
+        """
+        Mutable counter dict of one vehicle.
+        """
+        return self.vehicles[vid]
+
+    def merge_vehicle(self, vid, counters):
+        """
+        Add counters recorded elsewhere, e.g. by a worker process.
+        """
+        self.vehicles[vid].update(counters)
+
+    def totals(self):
+        """
+        Fleet-wide sums of the per-vehicle counters.
+        """
+        total = {}
+        for counters in self.vehicles.values():
+            for name, value in counters.items():
+                total[name] = total.get(name, 0) + value
+        return total
+
+    def to_dict(self):
+        return {
+            "phases": dict(self.phases),
+            "iterations": self.iterations,
+            "balance_iterations": self.balance_iterations,
+            "shift": self.shift,
+            "totals": self.totals(),
+            "vehicles": {vid: dict(counters) for vid, counters in self.vehicles.items()},
+        }
+
+    def to_prometheus(self, prefix="route_planner"):
+        """
+        Prometheus text exposition format, one gauge family per metric.
+        """
+        lines = []
+
+        def family(name, help_text):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+
+        family("phase_seconds", "Wall time of planner phases.")
+        for phase, seconds in self.phases.items():
+            lines.append(f'{prefix}_phase_seconds{{phase="{phase}"}} {seconds!r}')
+        family("voronoi_iterations", "Voronoi iterations run by the last clustering.")
+        lines.append(f"{prefix}_voronoi_iterations {self.iterations}")
+        family("balance_iterations", "Capacity-balanced iterations run after the Voronoi ones.")
+        lines.append(f"{prefix}_balance_iterations {self.balance_iterations}")
+        if self.shift is not None:
+            family("voronoi_shift", "Center shift of the last clustering iteration.")
+            lines.append(f"{prefix}_voronoi_shift {self.shift!r}")
+        for name, help_text in VEHICLE_METRICS.items():
+            samples = [(vid, counters[name]) for vid, counters in self.vehicles.items()
+                       if name in counters]
+            if not samples:
+                continue
+            family(f"vehicle_{name}", help_text)
+            for vid, value in samples:
+                lines.append(f'{prefix}_vehicle_{name}{{vehicle="{vid}"}} {value!r}')
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,185 @@
+import numpy as np
+
+from client_table import ClientTable
+from compact_route import CompactRoute
+from route_trace import DEPOT, PICKUP, DELIVERY, RELOAD
+
+# columns of summary_table, with their printf formats
+_SUMMARY_COLUMNS = (
+    ("vehicle", "{}"),
+    ("distance", "{:.2f}"),
+    ("empty_distance", "{:.2f}"),
+    ("n_stops", "{}"),
+    ("n_pickups", "{}"),
+    ("n_deliveries", "{}"),
+    ("n_reloads", "{}"),
+    ("depot_returns", "{}"),
+    ("peak_load", "{:.2f}"),
+    ("utilization", "{:.1%}"),
+    ("load_factor", "{:.1%}"),
+)
+
+
+def point_keys(coords):
+    """
+    One complex number per (x, y) point; NumPy sorts and searches complex
+    values lexicographically, so these act as exact coordinate keys.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    return coords[:, 0] + 1j * coords[:, 1]
+
+
+def _match(points, coords):
+    """
+    Row of `coords` equal to each point, or -1 where there is none.
+    """
+    keys = point_keys(coords)
+    wanted = point_keys(points)
+    if not len(keys):
+        return np.full(len(wanted), -1, dtype=np.intp)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    pos = np.minimum(np.searchsorted(sorted_keys, wanted), len(keys) - 1)
+    found = sorted_keys[pos] == wanted
+    return np.where(found, order[pos], -1)
+
+
+def route_metrics(solution, warehouses, clients, vehicles):
+    """
+    Per-vehicle metrics of a solution.
+
+    solution:   {vehicle_id: CompactRoute or [(x, y), ...]} as returned by the planners
+    warehouses, clients, vehicles: the planner input
+
+    Compact routes carry their stop kinds and loads. Coordinate routes are
+    matched exactly against client and warehouse coordinates, and as they hold
+    no loads, each trip is assumed to leave its warehouse with just the goods it
+    needs. Warehouse stops between the first and the last point count as
+    reloads, and as depot returns when at the vehicle's home warehouse.
+
+    Returns {vehicle_id: {'distance', 'empty_distance', 'n_stops', 'n_pickups',
+    'n_deliveries', 'n_reloads', 'depot_returns', 'peak_load', 'capacity',
+    'utilization', 'load_factor'}}, with utilization = peak_load / capacity and
+    load_factor the distance-weighted mean load / capacity.
+    """
+    if not isinstance(clients, ClientTable):
+        clients = ClientTable.from_records(clients)
+    wh_coords = np.array([(w["x"], w["y"]) for w in warehouses], dtype=np.float64).reshape(-1, 2)
+    wh_pos = {w["id"]: i for i, w in enumerate(warehouses)}
+    fleet = {v["id"]: v for v in vehicles}
+
+    stops = {}
+    for vid, route in solution.items():
+        if isinstance(route, CompactRoute):
+            stops[vid] = (route.coords, route.stops, route.kinds, route.loads)
+    stops.update(_match_routes({vid: route for vid, route in solution.items() if vid not in stops},
+                               clients, wh_coords))
+
+    metrics = {}
+    for vid in solution:
+        vehicle = fleet[vid]
+        metrics[vid] = _vehicle_metrics(*stops[vid], float(vehicle["capacity"]),
+                                        wh_pos[vehicle["warehouse_id"]])
+    return metrics
+
+
+def _match_routes(routes, clients, wh_coords):
+    """
+    Stops, kinds and lightest loads of coordinate routes, matching the points of
+    all routes in one pass.
+    Returns {vehicle_id: (coords, stops, kinds, loads)}
+    """
+    if not routes:
+        return {}
+    vids = list(routes)
+    coords = [np.asarray(routes[vid], dtype=np.float64).reshape(-1, 2) for vid in vids]
+    points = np.concatenate(coords)
+    client_rows = _match(points, clients.coords)
+    wh_rows = _match(points, wh_coords)
+    unknown = (client_rows < 0) & (wh_rows < 0)
+    if unknown.any():
+        x, y = points[np.argmax(unknown)]
+        raise ValueError(f"route point ({x}, {y}) is neither a client nor a warehouse")
+
+    n_goods = clients.demand.shape[1]
+    matched = {}
+    offset = 0
+    for vid, xy in zip(vids, coords):
+        n = len(xy)
+        rows = client_rows[offset:offset + n]
+        whs = wh_rows[offset:offset + n]
+        offset += n
+
+        is_client = rows >= 0
+        kinds = np.where(is_client, np.where(clients.is_pickup[np.where(is_client, rows, 0)],
+                                             PICKUP, DELIVERY), RELOAD)
+        if n:
+            kinds[0] = DEPOT
+            if not is_client[-1]:
+                kinds[-1] = DEPOT
+        demand = np.zeros((n, n_goods))
+        demand[is_client] = clients.demand[rows[is_client]]
+        # trips start at the first point and at every warehouse stop after it
+        starts = np.flatnonzero(~is_client | (np.arange(n) == 0))
+        # load after each point: trip start load minus the demand served so far
+        served = np.cumsum(demand, axis=0)
+        trip = np.cumsum(np.isin(np.arange(n), starts)) - 1
+        before = served[starts] - demand[starts]
+        start_load = np.maximum(np.maximum.reduceat(served, starts, axis=0) - before, 0.0)
+        loads = (start_load[trip] - (served - before[trip])).sum(axis=1)
+        matched[vid] = (xy, np.where(is_client, rows, whs), kinds, loads)
+    return matched
+
+
+def _vehicle_metrics(xy, stops, kinds, loads, capacity, home):
+    n = len(xy)
+    is_client = (kinds == PICKUP) | (kinds == DELIVERY)
+    at_warehouse = np.flatnonzero(~is_client)
+    reloads = at_warehouse[(at_warehouse > 0) & (at_warehouse < n - 1)]
+    seg = np.hypot(*np.diff(xy, axis=0).T)
+    distance = float(seg.sum())
+    carried = loads[:-1]
+    peak_load = float(loads.max()) if n else 0.0
+    return {
+        "distance": distance,
+        "empty_distance": float(seg[carried <= 1e-9 * max(capacity, 1.0)].sum()),
+        "n_stops": int(is_client.sum()),
+        "n_pickups": int((kinds == PICKUP).sum()),
+        "n_deliveries": int((kinds == DELIVERY).sum()),
+        "n_reloads": len(reloads),
+        "depot_returns": int((stops[reloads] == home).sum()),
+        "peak_load": peak_load,
+        "capacity": capacity,
+        "utilization": peak_load / capacity if capacity > 0 else 0.0,
+        "load_factor": (float(seg @ carried) / distance / capacity
+                        if distance > 0 and capacity > 0 else 0.0),
+    }
+
+
+def totals(metrics):
+    """
+    Fleet-wide sums of the count and distance metrics, and the mean utilization.
+    """
+    total = {name: sum(m[name] for m in metrics.values())
+             for name in ("distance", "empty_distance", "n_stops", "n_pickups",
+                          "n_deliveries", "n_reloads", "depot_returns")}
+    total["peak_load"] = max((m["peak_load"] for m in metrics.values()), default=0.0)
+    for name in ("utilization", "load_factor"):
+        total[name] = (sum(m[name] for m in metrics.values()) / len(metrics)) if metrics else 0.0
+    return total
+
+
+def summary_table(metrics):
+    """
+    Plain-text table of route_metrics output, one row per vehicle and a total row.
+    """
+    header = [name for name, _ in _SUMMARY_COLUMNS]
+    rows = [[fmt.format(vid if name == "vehicle" else m[name]) for name, fmt in _SUMMARY_COLUMNS]
+            for vid, m in metrics.items()]
+    total = totals(metrics)
+    rows.append([fmt.format("total" if name == "vehicle" else total[name])
+                 for name, fmt in _SUMMARY_COLUMNS])
+    widths = [max(len(cell) for cell in column) for column in zip(header, *rows)]
+    lines = ["  ".join(cell.rjust(w) for cell, w in zip(row, widths)) for row in [header] + rows]
+    lines.insert(1, "  ".join("-" * w for w in widths))
+    return "\n".join(lines)
@@ -1,12 +1,20 @@
 import logging
 import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
 import numpy as np
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)s: %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S"
-)
+from client_table import ClientTable
+from compact_route import CompactRoute
+from local_search import improve_trip
+from planner_stats import PlannerStats
+from route_repair import feasible_insertions, insertion_costs, min_start_inventory, trip_feasible
+from route_trace import DEPOT, PICKUP, DELIVERY, RELOAD, RouteTrace
+from spatial_index import GridIndex, balanced_assignment, nearest_center
+from stock_ledger import StockLedger
+
 logger = logging.getLogger(__name__)
 
 
@@ -16,231 +24,834 @@ class RoutePlanner:
     multi-type, capacity-aware routes using nearby pickups/deliveries.
     """
 
-    def __init__(self, warehouses, clients, vehicles, max_iters=10, tol=1e-2):
+    def __init__(self, warehouses, clients, vehicles, max_iters=10, tol=1e-2,
+                 chunk_size=8192, n_workers=None, trace=None,
+                 local_search=False, local_search_budget=1.0, balanced=False, balance_slack=0.02,
+                 candidate_batch=32, split_orders=True):
         """
-        warehouses: list of {'id': int, 'x': float, 'y': float}
-        clients:    list of {'id': int, 'x': float, 'y': float,
+        warehouses: list of {'id': int, 'x': float, 'y': float}, optionally with
+                    'stock' and 'storage': {good: float} (see StockLedger.from_warehouses)
+        clients:    ClientTable, or list of {'id': int, 'x': float, 'y': float,
                               'demand': {good: float,...}, 'is_pickup': bool}
         vehicles:   list of {'id': int, 'type': str, 'capacity': float, 'warehouse_id': int}
+        chunk_size: number of clients per batch in nearest-center computations
+        n_workers:  if > 1, build vehicle routes in a pool of that many processes
+        trace:      optional RouteTrace that records every load, pickup, delivery and reload
+                    (in greedy construction order, before local search)
+        local_search:        if True, shorten each greedy route with 2-opt / Or-opt moves
+        local_search_budget: seconds of local search allowed per vehicle route
+        balanced:      if True, refine the Voronoi clusters so every vehicle gets a share
+                       of the total demand proportional to its capacity
+        balance_slack: relative overshoot of its share a vehicle may take when balanced
+        candidate_batch: nearest clients the greedy tests one by one before testing
+                         all remaining clients in one array operation
+        split_orders:  if True, orders heavier than the largest vehicle capacity are split
+                       into equal parts that fit it, see split_clients; if False they
+                       raise ValueError
         """
         self.warehouses = {wh["id"]: np.array((wh["x"], wh["y"]), dtype=float)
                            for wh in warehouses}
-        self.clients = {c["id"]: np.array((c["x"], c["y"]), dtype=float)
-                        for c in clients}
-        self.demands = {c["id"]: c["demand"] for c in clients}
-        self.is_pickup = {c["id"]: c["is_pickup"] for c in clients}
+        self.warehouse_ids = list(self.warehouses)
+        self.warehouse_coords = np.array(list(self.warehouses.values()), dtype=float).reshape(-1, 2)
+        self.warehouse_locs = list(map(tuple, self.warehouse_coords))
+        self.warehouse_index = GridIndex(self.warehouse_coords)
+        self.warehouse_pos = {wid: w for w, wid in enumerate(self.warehouse_ids)}
+        self.warehouse_loc_pos = {loc: w for w, loc in enumerate(self.warehouse_locs)}
         self.vehicles = vehicles
         self.vehicle_ids = [v["id"] for v in vehicles]
         self.wh_map = {v["id"]: v["warehouse_id"] for v in vehicles}
         self.capacities = {v["id"]: v["capacity"] for v in vehicles}
-        self.centers = {vid: self.warehouses[self.wh_map[vid]].copy()
-                        for vid in self.vehicle_ids}
+        self.capacity_array = np.array([self.capacities[vid] for vid in self.vehicle_ids], dtype=float)
+        self.split_orders = split_orders
+        # {client_id: number of parts} of the orders split to fit the fleet
+        self.split_clients = {}
+        if not isinstance(clients, ClientTable):
+            clients = ClientTable.from_records(clients)
+        self.clients = self.check_orders(clients)
+        self.anchors = np.array([self.warehouses[self.wh_map[vid]]
+                                 for vid in self.vehicle_ids], dtype=float).reshape(-1, 2)
+        self.centers = self.anchors.copy()
         self.max_iters = max_iters
+        self.chunk_size = chunk_size
+        self.n_workers = n_workers
         self.tol = tol
-        self.good_types = list(next(iter(self.demands.values())).keys())
+        self.good_types = clients.good_types
+        # stock and storage of the warehouses, booked by every route; None when unlimited
+        self.ledger = StockLedger.from_warehouses(warehouses, self.good_types)
+        if trace is not None and trace.good_types is None:
+            trace.good_types = list(self.good_types)
+        self.trace = trace
+        self.local_search = local_search
+        self.local_search_budget = local_search_budget
+        self.balanced = balanced
+        self.balance_slack = balance_slack
+        self.candidate_batch = candidate_batch
+        # timings and counters of the last plan_routes() call
+        self.stats = PlannerStats()
+        # state of the last build_routes() call, kept for incremental updates:
+        # vehicle position per client row (-1 once removed), trips with client
+        # rows per vehicle, and the current routes
+        self.labels = None
+        self.vehicle_trips = {}
+        self.solution = None
         logger.info(f"Initialized RoutePlanner: {len(self.vehicles)} vehicles, {len(self.clients)} clients")
 
+    def assign_labels(self):
+        """
+        Index (into self.vehicle_ids) of the nearest vehicle center for every client,
+        computed in batches of self.chunk_size clients.
+        Returns int array of shape (n_clients,)
+        """
+        return nearest_center(self.clients.coords, self.centers, self.chunk_size)
+
+    def assign_balanced_labels(self):
+        """
+        Like assign_labels, but each vehicle takes at most its capacity-proportional
+        share of the total demand mass (pickups and deliveries alike), plus
+        balance_slack; clients that do not fit go to nearby vehicles with room left.
+        Returns int array of shape (n_clients,)
+        """
+        mass = np.abs(self.clients.demand).sum(axis=1)
+        capacities = self.capacity_array
+        limits = mass.sum() * capacities / capacities.sum() * (1.0 + self.balance_slack)
+        return balanced_assignment(self.clients.coords, self.centers, mass, limits,
+                                   chunk_size=self.chunk_size)
+
+    def check_orders(self, clients):
+        """
+        Validate every order against the fleet before planning: demand must be
+        finite and no order may weigh more than the largest vehicle capacity.
+        With split_orders, heavier orders are split into parts that fit instead
+        and recorded in self.split_clients.
+        clients: ClientTable
+        Returns the table to plan, clients itself unless orders were split.
+        """
+        finite = np.isfinite(clients.demand).all(axis=1)
+        if not finite.all():
+            raise ValueError(f"clients {clients.ids[~finite][:10].tolist()} have non-finite demand")
+        max_capacity = float(self.capacity_array.max()) if len(self.capacity_array) else 0.0
+        if max_capacity <= 0 and len(clients):
+            raise ValueError(f"the fleet has no capacity (largest is {max_capacity})")
+        if not len(clients):
+            return clients
+        table, parts = clients.split(max_capacity)
+        if table is clients:
+            return clients
+        oversized = parts > 1
+        ids = clients.ids[oversized].tolist()
+        if not self.split_orders:
+            raise ValueError(f"{len(ids)} orders weigh more than the largest vehicle capacity "
+                             f"{max_capacity}: clients {ids[:10]}")
+        self.split_clients.update(zip(ids, parts[oversized].tolist()))
+        logger.warning(f"Split {len(ids)} orders heavier than {max_capacity} into "
+                       f"{int(parts[oversized].sum())} parts: clients {ids[:10]}")
+        return table
+
+    def fit_labels(self, labels, clients):
+        """
+        Move clients heavier than the capacity of their labelled vehicle to the
+        vehicle with the nearest center among those that can carry them.
+        labels:  vehicle position (into self.vehicle_ids) of every client row
+        clients: ClientTable the labels refer to
+        Returns labels, changed in place.
+        """
+        weight = np.abs(clients.demand.sum(axis=1))
+        over = np.flatnonzero(weight > self.capacity_array[labels])
+        for start in range(0, len(over), self.chunk_size):
+            chunk = over[start:start + self.chunk_size]
+            diff = clients.coords[chunk, None, :] - self.centers[None, :, :]
+            dist = np.einsum("ijk,ijk->ij", diff, diff)
+            dist[weight[chunk, None] > self.capacity_array[None, :]] = np.inf
+            labels[chunk] = dist.argmin(axis=1)
+        if len(over):
+            logger.info(f"Moved {len(over)} clients to vehicles large enough to carry them")
+        return labels
+
+    def nearest_warehouse(self, loc):
+        """
+        Position (into self.warehouse_ids) of the warehouse nearest to an (x, y) location.
+        """
+        return self.warehouse_index.nearest(loc[0], loc[1])[0][1]
+
+    def _group_rows(self, labels):
+        """
+        Split client rows by label.
+        Returns one row array per vehicle (in self.vehicle_ids order), rows in client order.
+        """
+        order = np.argsort(labels, kind="stable")
+        bounds = np.cumsum(np.bincount(labels, minlength=len(self.vehicle_ids)))[:-1]
+        return np.split(order, bounds)
+
     def assign_clients(self):
         """
         Assign each client to nearest vehicle center.
         Returns {vehicle_id: [client_id, ...], ...}
         """
-        assignment = {vid: [] for vid in self.vehicle_ids}
-        for cid, coord in self.clients.items():
-            nearest_vid = min(
-                self.centers.keys(),
-                key=lambda vid: np.linalg.norm(coord - self.centers[vid])
-            )
-            assignment[nearest_vid].append(cid)
-        return assignment
+        groups = self._group_rows(self.assign_labels())
+        return {vid: self.clients.ids[rows].tolist()
+                for vid, rows in zip(self.vehicle_ids, groups)}
 
     def update_centers(self, assignment):
         """
         Recompute each vehicle center as centroid of assigned clients + its warehouse.
+        assignment: {vehicle_id: [client_id, ...]} or label array from assign_labels()
         Returns total shift.
         """
-        total_shift = 0.0
-        new_centers = {}
-        for vid, cids in assignment.items():
-            pts = [self.clients[cid] for cid in cids]
-            pts.append(self.warehouses[self.wh_map[vid]])
-            centroid = np.mean(pts, axis=0)
-            total_shift += np.linalg.norm(centroid - self.centers[vid])
-            new_centers[vid] = centroid
+        if isinstance(assignment, dict):
+            groups = [self.clients.rows_of(assignment[vid]) for vid in self.vehicle_ids]
+            labels = np.repeat(np.arange(len(groups)), [len(rows) for rows in groups])
+            coords = self.clients.coords[np.concatenate(groups)]
+        else:
+            labels = assignment
+            coords = self.clients.coords
+        n_vehicles = len(self.vehicle_ids)
+        # the warehouse anchor is one extra unit-weight sample per vehicle
+        counts = np.bincount(labels, minlength=n_vehicles) + 1.0
+        new_centers = np.empty_like(self.centers)
+        for axis in range(2):
+            sums = np.bincount(labels, weights=coords[:, axis], minlength=n_vehicles)
+            new_centers[:, axis] = (sums + self.anchors[:, axis]) / counts
+        total_shift = float(np.linalg.norm(new_centers - self.centers, axis=1).sum())
         self.centers = new_centers
         return total_shift
 
-    def plan_routes(self):
+    def cluster(self):
         """
-        Run centroidal Voronoi assignment, then build multi-type routes.
-        Returns {vehicle_id: [(x1,y1), (x2,y2), ...], ...}
+        Run centroidal Voronoi assignment until the centers move less than tol,
+        then, if balanced, as many capacity-balanced iterations.
+        Clients cancelled or replaced since the last plan are dropped first.
+        Returns one array of client rows per vehicle, in self.vehicle_ids order.
         """
-        assignment = {}
+        start = time.perf_counter()
+        self._drop_cancelled()
+        labels = None
         for it in range(self.max_iters):
-            assignment = self.assign_clients()
-            shift = self.update_centers(assignment)
+            labels = self.assign_labels()
+            shift = self.update_centers(labels)
             logger.info(f"Iteration {it}: shift = {shift:.4f}")
+            self.stats.iterations = it + 1
+            self.stats.shift = shift
             if shift < self.tol:
                 break
+        if labels is None:
+            labels = self.assign_labels()
+        if self.balanced:
+            # start from the Voronoi centers: spread out, so most clients keep their
+            # nearest vehicle and only the overflow moves
+            for it in range(self.max_iters):
+                labels = self.assign_balanced_labels()
+                shift = self.update_centers(labels)
+                logger.info(f"Balanced iteration {it}: shift = {shift:.4f}")
+                self.stats.balance_iterations = it + 1
+                self.stats.shift = shift
+                if shift < self.tol:
+                    break
+        groups = self._group_rows(self.fit_labels(labels, self.clients))
+        self.stats.add_phase("cluster", time.perf_counter() - start)
+        return groups
+
+    def plan_routes(self):
+        """
+        Run centroidal Voronoi assignment, then build multi-type routes.
+        Returns {vehicle_id: CompactRoute, ...}; routes iterate as (x, y) tuples
+        """
+        self.stats.reset()
+        return self.build_routes(self.cluster())
 
-        solution = {}
-        for vid, cids in assignment.items():
+    def build_routes(self, groups):
+        """
+        Build the route of every vehicle from its client rows.
+        groups: one array of client rows per vehicle, as returned by cluster()
+        Returns {vehicle_id: CompactRoute, ...}
+        """
+        tasks = []
+        if self.ledger is not None:
+            self.ledger.reset()
+        self.labels = np.full(len(self.clients), -1, dtype=np.intp)
+        for v, (vid, rows) in enumerate(zip(self.vehicle_ids, groups)):
+            self.labels[rows] = v
             depot = tuple(self.warehouses[self.wh_map[vid]])
-            logger.info(f"Vehicle {vid}: building route for {len(cids)} clients")
-            route = self._build_capacity_route(vid, depot, cids)
-            solution[vid] = route
-        return solution
+            logger.info(f"Vehicle {vid}: building route for {len(rows)} clients")
+            tasks.append((vid, depot, rows))
+
+        start = time.perf_counter()
+        if self.n_workers and self.n_workers > 1 and len(tasks) > 1:
+            routes = self._build_routes_parallel(tasks)
+        else:
+            routes = [self._build_capacity_route(*task) for task in tasks]
+        self.stats.add_phase("routes", time.perf_counter() - start)
+        self.solution = dict(zip(self.vehicle_ids, routes))
+        return dict(self.solution)
+
+    def _route_options(self):
+        """
+        Constructor arguments that affect route building, for worker-side planners.
+        """
+        return {
+            "trace": RouteTrace() if self.trace is not None else None,
+            "local_search": self.local_search,
+            "local_search_budget": self.local_search_budget,
+            "candidate_batch": self.candidate_batch,
+        }
 
-    def _build_capacity_route(self, vid, depot, cids):
+    def _build_routes_parallel(self, tasks):
+        """
+        Build the routes of `tasks` in a process pool. Client columns are published
+        once through shared memory; each task only ships its vehicle's client rows.
+        The stock ledger is shared too, so every worker books against the same stock.
+        Returns routes in task order.
+        """
+        warehouses = [{"id": wid, "x": float(xy[0]), "y": float(xy[1])}
+                      for wid, xy in self.warehouses.items()]
+        blocks, spec = self.clients.share()
+        ledger_blocks, ledger_spec = self.ledger.share() if self.ledger is not None else ([], None)
+        try:
+            with ProcessPoolExecutor(max_workers=min(self.n_workers, len(tasks)),
+                                     initializer=_init_route_worker,
+                                     initargs=(warehouses, self.vehicles, spec, ledger_spec,
+                                               self._route_options())) as pool:
+                routes = []
+                for task, (route, trips, trace, counters) in zip(tasks, pool.map(_build_route_task, tasks)):
+                    if trace is not None:
+                        self.trace.extend(trace)
+                    self.vehicle_trips[task[0]] = trips
+                    self.stats.merge_vehicle(task[0], counters)
+                    routes.append(route.bind(self.clients.coords, self.warehouse_coords))
+                return routes
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+            if self.ledger is not None:
+                self.ledger.release(ledger_blocks)
+
+    def _build_capacity_route(self, vid, depot, rows):
         """
         vid:       ID of vehicle
         depot:     (x, y) warehouse coordinates
-        cids:      list of client IDs assigned to this vehicle
+        rows:      array of client rows (ClientTable) assigned to this vehicle
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        trips = self._build_trips(vid, depot, rows)
+        # from positions in `rows` to client rows, as kept for incremental updates
+        self.vehicle_trips[vid] = [[start, inventory, rows[stops].tolist()]
+                                   for start, inventory, stops in trips]
+        return self._trips_to_route(vid)
+
+    def _trips_to_route(self, vid):
+        """
+        CompactRoute of self.vehicle_trips[vid], from depot to depot.
         """
-        unserved = set(cids)
-        locs = {cid: tuple(self.clients[cid]) for cid in cids}
-        demands = {cid: self.demands[cid] for cid in cids}
-        is_pickup = {cid: self.is_pickup[cid] for cid in cids}
+        route = CompactRoute.from_trips(self.vehicle_trips[vid], self.warehouse_pos[self.wh_map[vid]],
+                                        self.clients, self.warehouse_coords, self.warehouse_loc_pos)
+        self.stats.vehicle(vid)["route_length"] = route.length()
+        return route
+
+    def _build_trips(self, vid, depot, rows):
+        """
+        Greedy multi-trip construction for one vehicle.
+        Returns [[start (x, y), inventory when leaving start, [client positions in rows]], ...]
+        """
+        build_start = time.perf_counter()
+        # clients are addressed by their position k in `rows` from here on
+        coords = self.clients.coords[rows]
+        index = GridIndex(coords)
+        locs = list(map(tuple, coords))
+        # demand and pickup weights as arrays for testing many candidates at once,
+        # and as lists for testing them one by one
+        demand = self.clients.demand[rows]
+        pickup = self.clients.is_pickup[rows]
+        pickup_weight = -demand.sum(axis=1)
+        demands = demand.tolist()
+        is_pickup = pickup.tolist()
+        pickup_weights = pickup_weight.tolist()
+        ids = self.clients.ids[rows].tolist()
+        # reloads almost always start from a client, so its nearest warehouse is cached
+        client_wh = nearest_center(coords, self.warehouse_coords, self.chunk_size).tolist()
         good_types = self.good_types
+        n_goods = len(good_types)
         capacity = self.capacities[vid]
 
-        total_demands = {g: 0.0 for g in good_types}
-        for cid in cids:
-            if not is_pickup[cid]:
-                for g, amt in demands[cid].items():
+        ledger = self.ledger
+        home = self.warehouse_pos[self.wh_map[vid]]
+
+        total_demands = [0.0] * n_goods
+        for k, dvec in enumerate(demands):
+            if not is_pickup[k]:
+                for g, amt in enumerate(dvec):
                     total_demands[g] += amt
 
-        inventory = {g: 0.0 for g in good_types}
-        cap_left = capacity
-        for g in good_types:
-            if total_demands[g] <= 0:
-                continue
-            to_load = min(total_demands[g], cap_left)
-            inventory[g] = to_load
-            cap_left -= to_load
-            if cap_left <= 0:
-                break
+        with self._stock_lock():
+            # goods the home warehouse can supply
+            available = ledger.stock[home].tolist() if ledger is not None else [np.inf] * n_goods
+            inventory = [0.0] * n_goods
+            cap_left = capacity
+            for g in range(n_goods):
+                if total_demands[g] <= 0:
+                    continue
+                to_load = min(total_demands[g], cap_left, available[g])
+                inventory[g] = to_load
+                cap_left -= to_load
+                if cap_left <= 0:
+                    break
+            if ledger is not None:
+                ledger.move(home, loaded=inventory)
+
+        # deliveries by total weight, for the reload step
+        deliveries = [k for k in range(len(rows)) if not is_pickup[k]]
+        deliveries.sort(key=lambda k: sum(demands[k]))
+        delivery_weights = [sum(demands[k]) for k in deliveries]
+        first_pending = 0
+        pickups_left = sum(is_pickup)
 
-        logger.info(f"Vehicle {vid}: initial load from depot = {inventory} (cap_left={cap_left:.1f})")
+        def lightest_load(available=None):
+            # the lightest pending deliveries that fit, skipping those whose goods
+            # are not `available` (unlimited if None)
+            cap_left = capacity
+            new_inv = [0.0] * n_goods
+            for i in range(first_pending, len(deliveries)):
+                k = deliveries[i]
+                if k not in index:
+                    continue
+                weight = delivery_weights[i]
+                # ascending weights: nothing after this one fits either
+                if weight > cap_left:
+                    break
+                dvec = demands[k]
+                if available is not None and any(new_inv[g] + amt > available[g]
+                                                 for g, amt in enumerate(dvec)):
+                    continue
+                for g, amt in enumerate(dvec):
+                    new_inv[g] += amt
+                cap_left -= weight
+            return new_inv
 
-        route = [depot]
+        trace = self.trace
+        if trace is not None:
+            trace.record(vid, DEPOT, self.wh_map[vid], inventory, inventory)
+
+        # each trip: [start location, inventory when leaving it, client positions visited]
+        trips = [[depot, list(inventory), []]]
         current_loc = depot
+        current_k = None
+        n_checks = 0
 
-        def euclid(a, b):
-            return math.hypot(a[0] - b[0], a[1] - b[1])
+        def is_feasible(k):
+            if is_pickup[k]:
+                return load + pickup_weights[k] <= capacity
+            for g, amt in enumerate(demands[k]):
+                if inventory[g] < amt:
+                    return False
+            return True
 
-        def total_inventory(inv):
-            return sum(inv.values())
+        while len(index):
+            # candidates come nearest first, so the first feasible one is the greedy choice
+            next_k = None
+            load = sum(inventory)
+            for i, (_, k) in enumerate(index.iter_nearest(*current_loc)):
+                if i == self.candidate_batch:
+                    # far from any feasible client: test all remaining ones at once
+                    # instead of walking further out
+                    live = index.live_keys()
+                    n_checks += len(live) - i
+                    fits = np.where(pickup[live], load + pickup_weight[live] <= capacity,
+                                    (demand[live] <= inventory).all(axis=1))
+                    if fits.any():
+                        next_k = self._nearest_key(coords, live[fits], current_loc)
+                    break
+                n_checks += 1
+                if is_feasible(k):
+                    next_k = k
+                    break
 
-        while unserved:
-            feasible = []
-            for cid in unserved:
-                dvec = demands[cid]
-                if is_pickup[cid]:
-                    pickup_weight = sum(-amt for amt in dvec.values())
-                    if total_inventory(inventory) + pickup_weight <= capacity:
-                        feasible.append(cid)
-                else:
-                    ok = True
-                    for g, amt in dvec.items():
-                        if inventory[g] < amt:
-                            ok = False
-                            break
-                    if ok:
-                        feasible.append(cid)
-
-            if feasible:
-                next_cid = min(feasible, key=lambda cid: euclid(current_loc, locs[cid]))
-                dvec = demands[next_cid]
-                loc = locs[next_cid]
-                route.append(loc)
+            if next_k is not None:
+                dvec = demands[next_k]
+                loc = locs[next_k]
+                trips[-1][2].append(next_k)
                 current_loc = loc
+                current_k = next_k
 
-                if is_pickup[next_cid]:
-                    picked = {}
-                    for g, amt in dvec.items():
-                        pickup_amt = -amt
-                        inventory[g] += pickup_amt
-                        picked[g] = pickup_amt
-                    logger.info(f"Vehicle {vid}: picked up {picked} at client {next_cid}, inventory now={inventory}")
+                if is_pickup[next_k]:
+                    pickups_left -= 1
+                    for g, amt in enumerate(dvec):
+                        inventory[g] += -amt
+                    if trace is not None:
+                        trace.record(vid, PICKUP, ids[next_k], [-amt for amt in dvec], inventory)
                 else:
-                    delivered = {}
-                    for g, amt in dvec.items():
+                    for g, amt in enumerate(dvec):
                         inventory[g] -= amt
-                        delivered[g] = amt
-                    logger.info(f"Vehicle {vid}: delivered {delivered} to client {next_cid}, inventory now={inventory}")
+                    if trace is not None:
+                        trace.record(vid, DELIVERY, ids[next_k], dvec, inventory)
 
-                unserved.remove(next_cid)
+                index.remove(next_k)
 
             else:
-                nearest_client = min(unserved, key=lambda cid: euclid(current_loc, locs[cid]))
-                dist_client = euclid(current_loc, locs[nearest_client])
-                nearest_wh = min(
-                    self.warehouses.keys(),
-                    key=lambda wid: euclid(current_loc, tuple(self.warehouses[wid]))
-                )
-                wh_loc = tuple(self.warehouses[nearest_wh])
-                dist_wh = euclid(current_loc, wh_loc)
-
-                if dist_client < dist_wh:
-                    cid = nearest_client
-                    dvec = demands[cid]
-                    if is_pickup[cid]:
-                        weight = sum(-amt for amt in dvec.values())
-                        if total_inventory(inventory) + weight <= capacity:
-                            route.append(locs[cid])
-                            current_loc = locs[cid]
-                            picked = {}
-                            for g, amt in dvec.items():
-                                pickup_amt = -amt
-                                inventory[g] += pickup_amt
-                                picked[g] = pickup_amt
-                            logger.info(f"Vehicle {vid}: picked up {picked} at client {cid}, inventory now={inventory}")
-                            unserved.remove(cid)
-                            continue
-                    else:
-                        ok = True
-                        for g, amt in dvec.items():
-                            if inventory[g] < amt:
-                                ok = False
-                                break
-                        if ok:
-                            route.append(locs[cid])
-                            current_loc = locs[cid]
-                            delivered = {}
-                            for g, amt in dvec.items():
-                                inventory[g] -= amt
-                                delivered[g] = amt
-                            logger.info(f"Vehicle {vid}: delivered {delivered} to client {cid}, inventory now={inventory}")
-                            unserved.remove(cid)
-                            continue
-
-                route.append(wh_loc)
+                if len(trips) > 1 and not trips[-1][2]:
+                    # a fresh reload serves no one: these clients can never be served
+                    # (check_orders and fit_labels keep this from happening)
+                    raise ValueError(f"vehicle {vid} cannot carry the orders of clients "
+                                     f"{[ids[k] for k in index.live_keys()[:10].tolist()]}")
+                while first_pending < len(deliveries) and deliveries[first_pending] not in index:
+                    first_pending += 1
+
+                # nothing fits the current load: return to the nearest warehouse and reload
+                if ledger is not None:
+                    wh, new_inv = self._stock_reload(current_loc, inventory, lightest_load,
+                                                     pickups_left > 0)
+                    if wh is None:
+                        logger.warning(f"Vehicle {vid}: no warehouse can supply or store the goods "
+                                       f"of its last {len(index)} clients, leaving them unserved")
+                        break
+                elif current_k is None:
+                    wh = self.nearest_warehouse(current_loc)
+                else:
+                    wh = client_wh[current_k]
+                if ledger is None:
+                    new_inv = lightest_load()
+                wh_loc = self.warehouse_locs[wh]
                 current_loc = wh_loc
-                for g in inventory:
-                    inventory[g] = 0.0
-
-                deliveries = [
-                    (cid, demands[cid]) for cid in unserved
-                    if not is_pickup[cid]
-                ]
-                deliveries.sort(key=lambda item: sum(item[1].values()))
-
-                cap_left = capacity
-                new_inv = {g: 0.0 for g in good_types}
-                loaded_clients = []
-                for cid, dvec in deliveries:
-                    weight = sum(dvec.values())
-                    if weight <= cap_left:
-                        for g, amt in dvec.items():
-                            new_inv[g] += amt
-                        cap_left -= weight
-                        loaded_clients.append(cid)
+                current_k = None
 
                 inventory = new_inv
-                logger.info(f"Vehicle {vid}: reloaded for deliveries {loaded_clients} at warehouse {nearest_wh}, inventory now={inventory}")
+                trips.append([wh_loc, list(inventory), []])
+                if trace is not None:
+                    trace.record(vid, RELOAD, self.warehouse_ids[wh], inventory, inventory)
 
-        if current_loc != depot:
-            route.append(depot)
+        counters = self.stats.vehicle(vid)
+        counters["reloads"] = len(trips) - 1
+        if ledger is not None and any(inventory):
+            wh = self._stock_unload(home, current_loc, inventory)
+            if wh is None:
+                logger.warning(f"Vehicle {vid}: no warehouse has room for the goods left on board, "
+                               f"keeping them")
+            elif wh != home:
+                # home is full: unload at the nearest warehouse with room on the way back
+                trips.append([self.warehouse_locs[wh], [0.0] * n_goods, []])
+                if trace is not None:
+                    trace.record(vid, RELOAD, self.warehouse_ids[wh], [0.0] * n_goods, [0.0] * n_goods)
 
-        return route
+        counters["clients"] = len(rows)
+        counters["unserved"] = len(index)
+        counters["feasibility_checks"] = n_checks
+        if self.local_search:
+            ls_start = time.perf_counter()
+            self._improve_trips(trips, depot, rows, capacity)
+            counters["local_search_seconds"] = time.perf_counter() - ls_start
+        counters["build_seconds"] = time.perf_counter() - build_start
+        return trips
+
+    def _stock_lock(self):
+        return self.ledger.lock if self.ledger is not None else nullcontext()
+
+    def _stock_reload(self, loc, inventory, lightest_load, pickups_left):
+        """
+        Nearest warehouse to loc that has room for everything on board and stock
+        for a reload that lets the vehicle go on: some pending deliveries, or, with
+        pickups left, none at all. Both moves are booked in the ledger.
+        inventory:     goods on board, all unloaded at the warehouse
+        lightest_load: function of the goods available to the new load (G,)
+        Returns (warehouse position, new inventory), or (None, None) if no warehouse qualifies.
+        """
+        ledger = self.ledger
+        returned = np.maximum(inventory, 0.0)
+        with ledger.lock:
+            for _, w in self.warehouse_index.iter_nearest(*loc):
+                if (ledger.stock[w] + returned > ledger.storage[w] + 1e-9).any():
+                    continue
+                new_inv = lightest_load((ledger.stock[w] + returned).tolist())
+                if not pickups_left and not any(new_inv):
+                    continue
+                ledger.move(w, returned, new_inv)
+                return w, new_inv
+        return None, None
+
+    def _stock_unload(self, home, loc, inventory):
+        """
+        Warehouse that takes the goods left on board at the end of a route: home
+        if it has room for them, else the one nearest to loc that does. The
+        unload is booked in the ledger.
+        Returns the warehouse position, or None if no warehouse has room.
+        """
+        ledger = self.ledger
+        returned = np.maximum(inventory, 0.0)
+        with ledger.lock:
+            for w in [home] + [w for _, w in self.warehouse_index.iter_nearest(*loc)]:
+                if (ledger.stock[w] + returned > ledger.storage[w] + 1e-9).any():
+                    continue
+                ledger.move(w, unloaded=returned)
+                return w
+        return None
+
+    def _book_trips(self, vid, trips):
+        """
+        Book trips built outside _build_trips ([[start (x, y), inventory, [client
+        rows]], ...], as in self.vehicle_trips) in the ledger: every warehouse
+        stop unloads what is on board and loads the trip's inventory, and the
+        route ends with the unload of _stock_unload, which may append a trip.
+        Returns False, with the ledger unchanged, if a stop would load more than
+        the warehouse's stock or unload more than it can store.
+        """
+        ledger = self.ledger
+        demand = self.clients.demand
+        home = self.warehouse_pos[self.wh_map[vid]]
+        with ledger.lock:
+            saved = ledger.stock.copy()
+            on_board = np.zeros(len(self.good_types))
+            for i, (start, inventory, rows) in enumerate(trips):
+                w = home if i == 0 else self.warehouse_loc_pos[start]
+                returned = np.maximum(on_board, 0.0)
+                loaded = np.asarray(inventory, dtype=np.float64)
+                if ((ledger.stock[w] + returned > ledger.storage[w] + 1e-9).any()
+                        or (ledger.stock[w] + returned - loaded < -1e-9).any()):
+                    ledger.stock[...] = saved
+                    return False
+                ledger.move(w, returned, loaded)
+                on_board = loaded - demand[rows].sum(axis=0)
+        if any(on_board > 0):
+            last = trips[-1][2][-1] if trips[-1][2] else None
+            loc = tuple(self.clients.coords[last]) if last is not None else trips[-1][0]
+            wh = self._stock_unload(home, loc, on_board)
+            if wh is None:
+                logger.warning(f"Vehicle {vid}: no warehouse has room for the goods left on board, "
+                               f"keeping them")
+            elif wh != home:
+                trips.append([self.warehouse_locs[wh], [0.0] * len(self.good_types), []])
+        return True
+
+    @staticmethod
+    def _nearest_key(coords, keys, loc):
+        """
+        The key among `keys` (ascending) nearest to loc, ties to the lowest key,
+        in the order of GridIndex.iter_nearest.
+        """
+        x, y = loc
+        dist = np.hypot(coords[keys, 0] - x, coords[keys, 1] - y)
+        # np.hypot and math.hypot may differ in the last bit, so near-ties are
+        # settled with the distances iter_nearest uses
+        near = keys[dist <= dist.min() * (1 + 1e-12)].tolist()
+        xy = coords[near].tolist()
+        return min((math.hypot(px - x, py - y), k) for k, (px, py) in zip(near, xy))[1]
+
+    def _improve_trips(self, trips, depot, rows, capacity):
+        """
+        Reorder the clients of every trip in place with 2-opt / Or-opt moves,
+        within a time budget of self.local_search_budget seconds for the whole route.
+        Warehouse stops stay where the greedy put them.
+        """
+        deadline = time.perf_counter() + self.local_search_budget
+        coords = self.clients.coords[rows]
+        demand = self.clients.demand[rows]
+        for i, trip in enumerate(trips):
+            start, start_inventory, stops = trip
+            end = trips[i + 1][0] if i + 1 < len(trips) else depot
+            trip[2] = improve_trip(stops, coords, demand, start_inventory, capacity,
+                                   start, end, deadline=deadline)
+
+    def add_clients(self, clients):
+        """
+        Add clients to a planned solution. Each goes to the vehicle with the
+        nearest center and is inserted into that vehicle's route at the cheapest
+        position that keeps its trip feasible, or gets a trip of its own from the
+        nearest warehouse. Other routes are untouched.
+        clients: ClientTable, or list of client dicts as in __init__
+        Returns {vehicle_id: route} of the changed vehicles.
+        """
+        self._require_plan()
+        self._require_unlimited_stock()
+        if not isinstance(clients, ClientTable):
+            clients = ClientTable.from_records(clients, self.good_types)
+        clients = self.check_orders(clients)
+        index = self.clients.index
+        for cid in clients.ids.tolist():
+            if cid in index and self.labels[index[cid]] >= 0:
+                raise ValueError(f"client {cid} is already planned")
+        first = len(self.clients)
+        self.clients = self.clients.append(clients)
+        labels = self.fit_labels(nearest_center(clients.coords, self.centers, self.chunk_size), clients)
+        self.labels = np.concatenate((self.labels, labels))
+        changed = []
+        for row, label in enumerate(labels.tolist(), first):
+            vid = self.vehicle_ids[label]
+            self._insert_row(vid, row)
+            changed.append(vid)
+        return self._refresh_routes(changed)
+
+    def remove_clients(self, client_ids):
+        """
+        Cancel planned clients: each is dropped from its route, and where that
+        would overload the rest of its trip, the trip is split by a reload at the
+        warehouse nearest to the previous stop. Other routes are untouched.
+        Returns {vehicle_id: route} of the changed vehicles.
+        """
+        self._require_plan()
+        self._require_unlimited_stock()
+        client_ids = list(client_ids)
+        rows = self.clients.rows_of(client_ids).tolist()
+        for cid, row in zip(client_ids, rows):
+            if self.labels[row] < 0:
+                raise ValueError(f"client {cid} is not planned")
+        if self.split_clients:
+            # a split order is served by several rows, all with its id
+            rows = np.flatnonzero(np.isin(self.clients.ids, client_ids) & (self.labels >= 0)).tolist()
+        changed = []
+        for row in rows:
+            vid = self.vehicle_ids[self.labels[row]]
+            self._remove_row(vid, row)
+            self.labels[row] = -1
+            changed.append(vid)
+        return self._refresh_routes(changed)
+
+    def update_clients(self, clients):
+        """
+        Replace planned clients with new data under the same IDs (location,
+        demand or pickup flag): each is removed and added again.
+        clients: ClientTable, or list of client dicts as in __init__
+        Returns {vehicle_id: route} of the changed vehicles.
+        """
+        self._require_plan()
+        self._require_unlimited_stock()
+        if not isinstance(clients, ClientTable):
+            clients = ClientTable.from_records(clients, self.good_types)
+        # validate the new data before cancelling anything, so a bad update
+        # leaves the plan as it was
+        clients = self.check_orders(clients)
+        changed = self.remove_clients(clients.ids.tolist())
+        changed.update(self.add_clients(clients))
+        return changed
+
+    def planned_rows(self):
+        """
+        Client rows the current plan serves: all rows after plan_routes(), less
+        those cancelled by remove_clients(). Pass them to validate_solution as
+        `planned` after incremental changes.
+        """
+        self._require_plan()
+        return np.flatnonzero(self.labels >= 0)
+
+    def _drop_cancelled(self):
+        """
+        Remove the rows of cancelled clients, and the old rows of updated ones,
+        from self.clients. The plan refers to the old rows, so it is dropped too.
+        """
+        if self.labels is None or (self.labels >= 0).all():
+            return
+        self.clients = self.clients.take(self.planned_rows())
+        ids, counts = np.unique(self.clients.ids, return_counts=True)
+        parts = dict(zip(ids.tolist(), counts.tolist()))
+        self.split_clients = {cid: parts[cid] for cid in self.split_clients if parts.get(cid, 1) > 1}
+        self.labels = None
+        self.vehicle_trips = {}
+        self.solution = None
+
+    def _require_plan(self):
+        if self.solution is None:
+            raise RuntimeError("plan_routes() must run before clients can be changed")
+
+    def _require_unlimited_stock(self):
+        if self.ledger is not None:
+            # insertions and split trips load goods without checking the warehouses
+            raise RuntimeError("clients cannot be changed incrementally when warehouses "
+                               "model stock or storage; plan_routes() again instead")
+
+    def _refresh_routes(self, vids):
+        updated = {}
+        for vid in vids:
+            if vid not in updated:
+                updated[vid] = self.solution[vid] = self._trips_to_route(vid)
+        return updated
+
+    def _insert_row(self, vid, row):
+        """
+        Cheapest feasible insertion of one client row into a vehicle's trips.
+        """
+        trips = self.vehicle_trips[vid]
+        depot = tuple(self.warehouses[self.wh_map[vid]])
+        capacity = self.capacities[vid]
+        coords = self.clients.coords
+        demand = self.clients.demand
+        xy = coords[row]
+        if not trip_feasible(demand[[row]], capacity):
+            raise ValueError(f"client {self.clients.ids[row]} does not fit vehicle {vid}")
+
+        best_cost, best_trip, best_pos = np.inf, None, None
+        for i, (start, _, stops) in enumerate(trips):
+            end = trips[i + 1][0] if i + 1 < len(trips) else depot
+            points = np.vstack((start, coords[stops], end))
+            costs = np.where(feasible_insertions(demand[stops], demand[row], capacity),
+                             insertion_costs(points, xy), np.inf)
+            pos = int(np.argmin(costs))
+            if costs[pos] < best_cost:
+                best_cost, best_trip, best_pos = costs[pos], i, pos
+
+        # alternative: an extra trip from the warehouse nearest the client, just
+        # before the return to the depot
+        last = trips[-1][2][-1] if trips[-1][2] else None
+        before = coords[last] if last is not None else np.asarray(trips[-1][0])
+        wh = self.nearest_warehouse(xy)
+        wh_xy = self.warehouse_coords[wh]
+        extra = (np.hypot(*(wh_xy - before)) + np.hypot(*(xy - wh_xy))
+                 + np.hypot(*(np.asarray(depot) - xy)) - np.hypot(*(np.asarray(depot) - before)))
+        if extra < best_cost:
+            trips.append([self.warehouse_locs[wh], min_start_inventory(demand[[row]]).tolist(), [row]])
+            return
+        stops = trips[best_trip][2]
+        stops.insert(best_pos, row)
+        trips[best_trip][1] = min_start_inventory(demand[stops]).tolist()
+
+    def _remove_row(self, vid, row):
+        """
+        Drop one client row from a vehicle's trips, splitting its trip if needed.
+        """
+        trips = self.vehicle_trips[vid]
+        demand = self.clients.demand
+        i = next(i for i, trip in enumerate(trips) if row in trip[2])
+        start, _, stops = trips[i]
+        j = stops.index(row)
+        del stops[j]
+        if not stops and i > 0:
+            # the reload is no longer needed; the next trip starts with its own
+            del trips[i]
+            return
+        if trip_feasible(demand[stops], self.capacities[vid]):
+            trips[i][1] = min_start_inventory(demand[stops]).tolist()
+            return
+        # the served demand no longer offsets later pickups: both halves are
+        # feasible on their own, with a reload in between
+        head, tail = stops[:j], stops[j:]
+        before = self.clients.coords[head[-1]] if head else start
+        wh = self.nearest_warehouse(before)
+        trips[i] = [start, min_start_inventory(demand[head]).tolist(), head]
+        trips.insert(i + 1, [self.warehouse_locs[wh], min_start_inventory(demand[tail]).tolist(), tail])
+
+
+_worker_planner = None
+
+
+def _init_route_worker(warehouses, vehicles, spec, ledger_spec, options):
+    """
+    Process pool initializer: map the shared client table, and the shared stock
+    ledger if there is one, into a worker-local planner.
+    """
+    global _worker_planner
+    clients, blocks = ClientTable.attach(spec)
+    _worker_planner = RoutePlanner(warehouses, clients, vehicles, **options)
+    if ledger_spec is not None:
+        _worker_planner.ledger, ledger_blocks = StockLedger.attach(ledger_spec)
+        blocks += ledger_blocks
+    # the mapped blocks back the table's arrays for the lifetime of the worker
+    _worker_planner._shared_blocks = blocks
+
+
+def _build_route_task(task):
+    """
+    Returns (route, trips, trace, counters): trips with client rows, trace holds
+    only this vehicle's events (or is None), counters are its PlannerStats
+    vehicle counters.
+    """
+    planner = _worker_planner
+    vid = task[0]
+    if planner.trace is not None:
+        planner.trace = RouteTrace(planner.good_types)
+    route = planner._build_capacity_route(*task)
+    return (route, planner.vehicle_trips.pop(vid), planner.trace,
+            planner.stats.vehicles.pop(vid, {}))
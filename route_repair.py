@@ -0,0 +1,64 @@
+import numpy as np
+
+# Trips are repaired under the loading rule of the greedy: at a warehouse the
+# vehicle may load anything, so a trip is feasible when it is feasible with the
+# lightest start load that never lets a good go below zero.
+
+
+def min_start_inventory(demand):
+    """
+    Lightest start load (G,) that serves a trip with signed demand (m, G)
+    (negative for pickups) without any good going below zero.
+    """
+    if not len(demand):
+        return np.zeros(demand.shape[1])
+    return np.maximum(np.cumsum(demand, axis=0).max(axis=0), 0.0)
+
+
+def trip_feasible(demand, capacity, tol=1e-9):
+    """
+    Whether the lightest start load keeps the total load within capacity at every stop.
+    """
+    if not len(demand):
+        return True
+    cum = np.cumsum(demand, axis=0)
+    start = np.maximum(cum.max(axis=0), 0.0)
+    peak = max(start.sum(), (start - cum).sum(axis=1).max())
+    return peak <= capacity + tol * max(capacity, 1.0)
+
+
+def insertion_costs(points, xy):
+    """
+    Extra distance of visiting xy in each gap of a path.
+    points: (m + 2, 2) trip start, m stops, trip end
+    Returns (m + 1,) costs; entry p inserts xy after the p-th stop.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    to_x = np.hypot(points[:, 0] - xy[0], points[:, 1] - xy[1])
+    legs = np.hypot(*np.diff(points, axis=0).T)
+    return to_x[:-1] + to_x[1:] - legs
+
+
+def feasible_insertions(demand, new_demand, capacity, tol=1e-9):
+    """
+    For every gap p of a trip with demand (m, G), whether inserting a stop with
+    demand (G,) there keeps the trip feasible. Evaluated for all gaps at once
+    from prefix and suffix extrema of the cumulative demand.
+    Returns (m + 1,) bool.
+    """
+    m, n_goods = demand.shape
+    # cum[p]: demand served after the first p stops
+    cum = np.vstack((np.zeros((1, n_goods)), np.cumsum(demand, axis=0)))
+    total = cum.sum(axis=1)
+    prefix_max = np.maximum.accumulate(cum, axis=0)
+    prefix_min = np.minimum.accumulate(total)
+    suffix_max = np.full((m + 1, n_goods), -np.inf)
+    suffix_min = np.full(m + 1, np.inf)
+    if m:
+        suffix_max[:-1] = np.maximum.accumulate(cum[:0:-1], axis=0)[::-1]
+        suffix_min[:-1] = np.minimum.accumulate(total[:0:-1])[::-1]
+    shifted = cum + new_demand
+    start = np.maximum.reduce([prefix_max, shifted, suffix_max + new_demand,
+                               np.zeros_like(cum)])
+    lowest = np.minimum.reduce([prefix_min, total + new_demand.sum(), suffix_min + new_demand.sum()])
+    return start.sum(axis=1) - lowest <= capacity + tol * max(capacity, 1.0)
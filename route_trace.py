@@ -0,0 +1,96 @@
+from collections import namedtuple
+
+import numpy as np
+
+# event kinds
+DEPOT, PICKUP, DELIVERY, RELOAD = 0, 1, 2, 3
+KIND_NAMES = {DEPOT: "depot", PICKUP: "pickup", DELIVERY: "delivery", RELOAD: "reload"}
+
+TraceEvent = namedtuple("TraceEvent", "vehicle kind site amounts inventory")
+
+
+class RouteTrace:
+    """
+    Recorder of typed route-building events. Pass one to RoutePlanner(trace=...)
+    to enable it; planners without a trace skip recording entirely.
+
+    Every event stores the vehicle ID, its kind, the site (client ID for pickups
+    and deliveries, warehouse ID for the initial depot load and reloads), the
+    amounts moved per good type and the vehicle inventory after the event.
+    """
+
+    def __init__(self, good_types=None):
+        self.good_types = list(good_types) if good_types is not None else None
+        self.vehicles = []
+        self.kinds = []
+        self.sites = []
+        self.amounts = []
+        self.inventory = []
+
+    def record(self, vehicle, kind, site, amounts, inventory):
+        """
+        amounts, inventory: per-good sequences ordered like good_types; both are copied.
+        """
+        self.vehicles.append(vehicle)
+        self.kinds.append(kind)
+        self.sites.append(site)
+        self.amounts.append(list(amounts))
+        self.inventory.append(list(inventory))
+
+    def extend(self, other):
+        """
+        Append all events of another trace, e.g. one recorded in a worker process.
+        """
+        if self.good_types is None:
+            self.good_types = other.good_types
+        self.vehicles.extend(other.vehicles)
+        self.kinds.extend(other.kinds)
+        self.sites.extend(other.sites)
+        self.amounts.extend(other.amounts)
+        self.inventory.extend(other.inventory)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def events(self):
+        for event in zip(self.vehicles, self.kinds, self.sites, self.amounts, self.inventory):
+            yield TraceEvent(*event)
+
+    def to_arrays(self):
+        """
+        Columnar view: {'vehicle', 'kind', 'warehouse_site', 'client_site', 'amounts',
+        'inventory', 'good_types'}. Warehouse and client IDs may differ in type, so
+        sites are split by kind: 'warehouse_site' holds the sites of the depot and
+        reload events, 'client_site' those of the others, each in event order.
+        """
+        n_goods = len(self.good_types or ())
+        at_warehouse = [kind == DEPOT or kind == RELOAD for kind in self.kinds]
+        return {
+            "vehicle": np.asarray(self.vehicles),
+            "kind": np.asarray(self.kinds, dtype=np.int8),
+            "warehouse_site": np.asarray([s for s, w in zip(self.sites, at_warehouse) if w]),
+            "client_site": np.asarray([s for s, w in zip(self.sites, at_warehouse) if not w]),
+            "amounts": np.asarray(self.amounts, dtype=np.float64).reshape(-1, n_goods),
+            "inventory": np.asarray(self.inventory, dtype=np.float64).reshape(-1, n_goods),
+            "good_types": np.asarray(self.good_types or [], dtype=str),
+        }
+
+    def dump(self, path):
+        """
+        Write the trace as a compressed .npz file.
+        """
+        np.savez_compressed(path, **self.to_arrays())
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            trace = cls(data["good_types"].tolist())
+            trace.vehicles = data["vehicle"].tolist()
+            trace.kinds = data["kind"].tolist()
+            warehouse_sites = iter(data["warehouse_site"].tolist())
+            client_sites = iter(data["client_site"].tolist())
+            trace.sites = [next(warehouse_sites) if kind == DEPOT or kind == RELOAD else next(client_sites)
+                           for kind in trace.kinds]
+            trace.amounts = data["amounts"].tolist()
+            trace.inventory = data["inventory"].tolist()
+        return trace
@@ -0,0 +1,218 @@
+import numpy as np
+
+from client_table import ClientTable
+from compact_route import CompactRoute
+from route_metrics import point_keys
+
+# stops replayed per vectorized pass, bounding the size of the (stops, goods) arrays
+_STOPS_PER_PASS = 1 << 20
+
+
+def validate_solution(solution, warehouses, clients, vehicles, tol=1e-6, limit=100, planned=None):
+    """
+    Check a solution by replaying the inventory of every route with cumulative
+    sums: every client must be served exactly once, no load may exceed the
+    vehicle capacity and no trip may run out of the goods it delivers.
+
+    solution:   {vehicle_id: CompactRoute or [(x, y), ...]} as returned by the planners
+    warehouses, vehicles: the planner input
+    clients:    ClientTable (or list of client dicts) the routes were planned on;
+                pass planner.clients when orders may have been split
+    tol:        load tolerance, relative to max(capacity, 1)
+    limit:      most entries listed per kind of problem; the counts are complete
+    planned:    client rows that must be served, e.g. planner.planned_rows() after
+                incremental changes; all rows if None. Other rows must not be
+                served, and visits to them count as double-served.
+
+    A trip starts at every warehouse stop. Compact routes carry the goods each trip
+    leaves its warehouse with, and every good is replayed on its own, so a trip
+    that loads one good and delivers another is short. Coordinate routes hold no
+    loads: each of their trips is replayed with the lightest load that serves it,
+    which checks capacity but can never run short, so negative inventory is only
+    found on compact routes. Compact routes without per-good inventory are checked
+    on their total load. Coordinate routes are matched exactly against client
+    coordinates, the k-th visit of a point going to the k-th client there.
+
+    Returns {'valid': bool, 'n_stops': int,
+             'unserved', 'double_served': [client_id, ...],
+             'capacity_violations': [{'vehicle', 'stop', 'load', 'capacity'}, ...],
+             'negative_inventory': [{'vehicle', 'stop', 'good', 'shortfall'}, ...],
+             'unknown_points': [{'vehicle', 'stop'}, ...]}
+    with an 'n_<problem>' count next to every list; stops index into the route and
+    'good' is the good type a trip runs shortest of (None when only the total is known).
+    """
+    if not isinstance(clients, ClientTable):
+        clients = ClientTable.from_records(clients)
+    wh_keys = point_keys([(w["x"], w["y"]) for w in warehouses])
+    fleet = {v["id"]: v for v in vehicles}
+
+    n_goods = clients.demand.shape[1]
+
+    vids = list(solution)
+    routes = {}
+    for vid in vids:
+        route = solution[vid]
+        if isinstance(route, CompactRoute):
+            at_warehouse = route.at_warehouse
+            rows = np.where(at_warehouse, -1, route.stops).astype(np.intp)
+            loads = np.where(at_warehouse, route.loads, np.nan)
+            inventory = route.inventory
+            if inventory is None:
+                inventory = np.full((int(at_warehouse.sum()), n_goods), np.nan)
+            routes[vid] = (rows, at_warehouse, loads, inventory)
+    routes.update(_match_routes({vid: solution[vid] for vid in vids if vid not in routes},
+                                clients, wh_keys))
+
+    report = {"valid": True, "n_stops": 0}
+    for problem in ("unserved", "double_served", "capacity_violations", "negative_inventory",
+                    "unknown_points"):
+        report[f"n_{problem}"] = 0
+        report[problem] = []
+
+    visits = np.zeros(len(clients), dtype=np.intp)
+    batch = []
+    n_batch = 0
+    for vid in vids:
+        batch.append(vid)
+        n_batch += len(routes[vid][0])
+        if n_batch >= _STOPS_PER_PASS:
+            visits += _replay(batch, routes, clients, fleet, tol, limit, report)
+            batch, n_batch = [], 0
+    if batch:
+        visits += _replay(batch, routes, clients, fleet, tol, limit, report)
+
+    expected = np.ones(len(clients), dtype=np.intp)
+    if planned is not None:
+        expected[:] = 0
+        expected[planned] = 1
+    for problem, rows in (("unserved", visits < expected), ("double_served", visits > expected)):
+        # parts of a split order share their client id
+        ids = np.unique(clients.ids[rows])
+        report[f"n_{problem}"] = len(ids)
+        report[problem] = ids[:limit].tolist()
+    report["valid"] = not any(report[f"n_{problem}"] for problem in
+                              ("unserved", "double_served", "capacity_violations",
+                               "negative_inventory", "unknown_points"))
+    return report
+
+
+def _match_routes(routes, clients, wh_keys):
+    """
+    Client rows and warehouse flags of coordinate routes, matching the points of
+    all routes in one pass. The first point of a route is its depot.
+    Returns {vehicle_id: (rows, at_warehouse, loads, inventory)}; rows are -1 away
+    from clients (unknown points are -2), loads and the (trips, G) inventory are all NaN.
+    """
+    if not routes:
+        return {}
+    vids = list(routes)
+    coords = [np.asarray(routes[vid], dtype=np.float64).reshape(-1, 2) for vid in vids]
+    lengths = [len(xy) for xy in coords]
+    points = np.concatenate(coords)
+    first = np.zeros(len(points), dtype=bool)
+    first[np.cumsum([0] + lengths[:-1])[np.array(lengths) > 0]] = True
+
+    keys = point_keys(points)
+    client_keys = point_keys(clients.coords)
+    order = np.argsort(client_keys, kind="stable")
+    sorted_keys = client_keys[order]
+    # points in key order (route order among equal points); sorted queries keep
+    # the searches cache-friendly
+    by_key = np.argsort(keys, kind="stable")
+    lo = np.searchsorted(sorted_keys, keys[by_key], side="left")
+    hi = np.searchsorted(sorted_keys, keys[by_key], side="right")
+    is_visit = (hi > lo) & ~first[by_key]
+    by_key, lo, hi = by_key[is_visit], lo[is_visit], hi[is_visit]
+
+    # k-th visit of a point (in route order) serves the k-th client at it;
+    # visits beyond the clients there go to the last one, which shows them as double-served
+    group_start = np.ones(len(by_key), dtype=bool)
+    group_start[1:] = lo[1:] != lo[:-1]
+    position = np.arange(len(by_key))
+    rank = position - np.maximum.accumulate(np.where(group_start, position, 0))
+    rows = np.full(len(points), -1, dtype=np.intp)
+    rows[by_key] = order[np.minimum(lo + rank, hi - 1)]
+    at_warehouse = (rows < 0) & np.isin(keys, wh_keys)
+    rows[(rows < 0) & ~at_warehouse] = -2
+
+    n_goods = clients.demand.shape[1]
+    matched = {}
+    offset = 0
+    for vid, n in zip(vids, lengths):
+        flags = at_warehouse[offset:offset + n]
+        # a trip starts at every warehouse point and at the first point
+        n_trips = int(flags.sum()) + int(n > 0 and not flags[0])
+        matched[vid] = (rows[offset:offset + n], flags, np.full(n, np.nan),
+                        np.full((n_trips, n_goods), np.nan))
+        offset += n
+    return matched
+
+
+def _replay(vids, routes, clients, fleet, tol, limit, report):
+    """
+    Replay the routes of `vids` as one concatenated stop sequence, adding their
+    problems to report. Returns the visit count of every client row.
+    """
+    lengths = np.array([len(routes[vid][0]) for vid in vids])
+    rows = np.concatenate([routes[vid][0] for vid in vids])
+    at_warehouse = np.concatenate([routes[vid][1] for vid in vids])
+    recorded = np.concatenate([routes[vid][2] for vid in vids])
+    n_goods = clients.demand.shape[1]
+    inventory = np.concatenate([routes[vid][3] for vid in vids]).reshape(-1, n_goods)
+    capacities = np.array([float(fleet[vid]["capacity"]) for vid in vids])
+    offsets = np.cumsum(lengths) - lengths
+    n = len(rows)
+    report["n_stops"] += n
+    vehicle = np.repeat(np.arange(len(vids)), lengths)
+    stop = np.arange(n) - offsets[vehicle]
+
+    unknown = np.flatnonzero(rows == -2)
+    _add(report, "unknown_points", unknown, limit,
+         lambda i: {"vehicle": vids[vehicle[i]], "stop": int(stop[i])})
+
+    is_client = rows >= 0
+    demand = np.zeros((n, n_goods))
+    demand[is_client] = clients.demand[rows[is_client]]
+    # a trip starts at every warehouse stop and at the first stop of every route
+    trip_start = at_warehouse.copy()
+    trip_start[offsets[lengths > 0]] = True
+    starts = np.flatnonzero(trip_start)
+    trip = np.cumsum(trip_start) - 1
+    # demand served so far within the trip, per good
+    served = np.cumsum(demand, axis=0)
+    served -= (served[starts] - demand[starts])[trip]
+    # lightest start inventory per good that never lets a good go below zero
+    if n:
+        needed = np.maximum(np.maximum.reduceat(served, starts, axis=0), 0.0)
+    else:
+        needed = np.zeros((0, n_goods))
+    start_load = np.where(np.isnan(recorded[starts]), needed.sum(axis=1), recorded[starts])
+    load = start_load[trip] - served.sum(axis=1)
+
+    margin = tol * np.maximum(capacities, 1.0)
+    over = np.flatnonzero(load > (capacities + margin)[vehicle])
+    _add(report, "capacity_violations", over, limit,
+         lambda i: {"vehicle": vids[vehicle[i]], "stop": int(stop[i]), "load": float(load[i]),
+                    "capacity": float(capacities[vehicle[i]])})
+    # per good where the inventory is known, else on the total load
+    by_good = ~np.isnan(inventory).any(axis=1)
+    shortfall = np.zeros(len(starts))
+    good = np.full(len(starts), -1)
+    if by_good.any() and n_goods:
+        gap = needed[by_good] - inventory[by_good]
+        good[by_good] = np.argmax(gap, axis=1)
+        shortfall[by_good] = gap.max(axis=1)
+    shortfall[~by_good] = needed[~by_good].sum(axis=1) - start_load[~by_good]
+    short = np.flatnonzero(shortfall > margin[vehicle[starts]])
+    _add(report, "negative_inventory", short, limit,
+         lambda t: {"vehicle": vids[vehicle[starts[t]]], "stop": int(stop[starts[t]]),
+                    "good": clients.good_types[good[t]] if good[t] >= 0 else None,
+                    "shortfall": float(shortfall[t])})
+
+    return np.bincount(rows[is_client], minlength=len(clients))
+
+
+def _add(report, problem, found, limit, entry):
+    report[f"n_{problem}"] += len(found)
+    room = limit - len(report[problem])
+    report[problem].extend(entry(i) for i in found[:max(room, 0)].tolist())
@@ -0,0 +1,242 @@
+import heapq
+import math
+import numpy as np
+
+
+def nearest_center(points, centers, chunk_size=8192, offsets=None):
+    """
+    Row index into `centers` of the nearest center for every point, first one on ties.
+    Distances are computed in batches of chunk_size points, so peak memory stays
+    at chunk_size x len(centers) floats.
+    offsets: optional (len(centers),) values added to the squared distance to each
+             center; the cells then form a power diagram instead of a Voronoi diagram
+    Returns int array of shape (len(points),)
+    """
+    labels = np.empty(len(points), dtype=np.intp)
+    for start in range(0, len(points), chunk_size):
+        block = points[start:start + chunk_size]
+        dx = block[:, 0, None] - centers[None, :, 0]
+        dy = block[:, 1, None] - centers[None, :, 1]
+        if offsets is None:
+            labels[start:start + len(block)] = np.argmin(np.sqrt(dx * dx + dy * dy), axis=1)
+        else:
+            labels[start:start + len(block)] = np.argmin(dx * dx + dy * dy + offsets, axis=1)
+    return labels
+
+
+def k_nearest_centers(points, centers, k, chunk_size=8192):
+    """
+    The k nearest centers of every point, nearest first, in batches of chunk_size points.
+    Returns (rows, distances), both of shape (len(points), min(k, len(centers))).
+    """
+    k = min(k, len(centers))
+    rows = np.empty((len(points), k), dtype=np.intp)
+    dists = np.empty((len(points), k))
+    for start in range(0, len(points), chunk_size):
+        block = points[start:start + chunk_size]
+        dx = block[:, 0, None] - centers[None, :, 0]
+        dy = block[:, 1, None] - centers[None, :, 1]
+        d2 = dx * dx + dy * dy
+        if k < len(centers):
+            part = np.argpartition(d2, k - 1, axis=1)[:, :k]
+        else:
+            part = np.broadcast_to(np.arange(k), d2.shape)
+        part_d2 = np.take_along_axis(d2, part, axis=1)
+        order = np.argsort(part_d2, axis=1, kind="stable")
+        rows[start:start + len(block)] = np.take_along_axis(part, order, axis=1)
+        dists[start:start + len(block)] = np.sqrt(np.take_along_axis(part_d2, order, axis=1))
+    return rows, dists
+
+
+def balanced_assignment(points, centers, mass, limits, k=8, chunk_size=8192):
+    """
+    Assign every point to a center without exceeding the centers' mass limits.
+
+    mass:   (N,) mass of every point
+    limits: (C,) total mass each center may take
+
+    Points propose to their k nearest open centers in turn, those with the most
+    to lose by not getting their nearest center (largest regret) first. A center
+    accepts proposals in that order while they fit and closes at the first one
+    that does not. Rejected points repeat with the centers still open; once all
+    are closed the remainder goes to the nearest center, so a limit can only be
+    exceeded when the limits add up to less than the total mass.
+    Returns int array of shape (len(points),)
+    """
+    n_centers = len(centers)
+    labels = np.empty(len(points), dtype=np.intp)
+    load = np.zeros(n_centers)
+    is_open = np.ones(n_centers, dtype=bool)
+    pending = np.arange(len(points))
+    while len(pending):
+        open_rows = np.flatnonzero(is_open)
+        if not len(open_rows):
+            labels[pending] = nearest_center(points[pending], centers, chunk_size)
+            break
+        choices, dists = k_nearest_centers(points[pending], centers[open_rows], k, chunk_size)
+        choices = open_rows[choices]
+        regret = dists[:, 1] - dists[:, 0] if choices.shape[1] > 1 else np.zeros(len(pending))
+        priority = np.argsort(-regret, kind="stable")
+        pending = pending[priority]
+        choices = choices[priority]
+        for r in range(choices.shape[1]):
+            if not len(pending):
+                break
+            # proposals grouped by center, in priority order within a center
+            order = np.lexsort((np.arange(len(pending)), choices[:, r]))
+            center = choices[order, r]
+            m = mass[pending[order]]
+            cum = np.cumsum(m)
+            first = np.searchsorted(center, center)
+            taken = cum - cum[first] + m[first]
+            accepted = is_open[center] & (load[center] + taken <= limits[center])
+            labels[pending[order[accepted]]] = center[accepted]
+            load += np.bincount(center[accepted], weights=m[accepted], minlength=n_centers)
+            is_open[center[~accepted]] = False
+            keep = np.ones(len(pending), dtype=bool)
+            keep[order[accepted]] = False
+            pending = pending[keep]
+            choices = choices[keep]
+    return labels
+
+
+class GridIndex:
+    """
+    Uniform grid over 2-D points with deletion and nearest-first iteration.
+    Points are addressed by their position in the coords array given at construction.
+    """
+
+    def __init__(self, coords, points_per_cell=2.0):
+        """
+        coords:          (N, 2) array of point coordinates
+        points_per_cell: target average occupancy used to size the cells
+        """
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        self.points_per_cell = points_per_cell
+        self._xy = self.coords.tolist()
+        self._alive = np.ones(len(self.coords), dtype=bool)
+        self._live = len(self.coords)
+        self._build(np.arange(len(self.coords)))
+
+    def _build(self, keys):
+        n = len(keys)
+        pts = self.coords[keys]
+        if n:
+            self.x0, self.y0 = pts.min(axis=0)
+            ext_x, ext_y = pts.max(axis=0) - (self.x0, self.y0)
+        else:
+            self.x0 = self.y0 = 0.0
+            ext_x = ext_y = 0.0
+        n_cells = max(n / self.points_per_cell, 1.0)
+        # square cells of the target occupancy, but no more than n_cells along the
+        # long side: thin (nearly collinear) point sets would get far more cells
+        # than points otherwise; coincident points get a single cell
+        cell = max(math.sqrt(ext_x * ext_y / n_cells), max(ext_x, ext_y) / n_cells) or 1.0
+        self.cell = cell
+        self.nx = int(ext_x / cell) + 1
+        self.ny = int(ext_y / cell) + 1
+        self.cells = [[] for _ in range(self.nx * self.ny)]
+        if n:
+            ix = np.minimum(((pts[:, 0] - self.x0) / cell).astype(np.intp), self.nx - 1)
+            iy = np.minimum(((pts[:, 1] - self.y0) / cell).astype(np.intp), self.ny - 1)
+            for key, c in zip(keys.tolist(), (iy * self.nx + ix).tolist()):
+                self.cells[c].append(key)
+
+    def _cell_of(self, x, y):
+        ix = min(int((x - self.x0) / self.cell), self.nx - 1)
+        iy = min(int((y - self.y0) / self.cell), self.ny - 1)
+        return ix, iy
+
+    def __len__(self):
+        return self._live
+
+    def __contains__(self, key):
+        return bool(self._alive[key])
+
+    def live_keys(self):
+        """
+        Keys of all live points, ascending.
+        """
+        return np.flatnonzero(self._alive)
+
+    def remove(self, key):
+        """
+        Delete point `key`. The grid is rebuilt over the remaining points once it
+        becomes mostly empty cells, so queries stay proportional to the live set.
+        """
+        ix, iy = self._cell_of(*self._xy[key])
+        self.cells[iy * self.nx + ix].remove(key)
+        self._alive[key] = False
+        self._live -= 1
+        if len(self.cells) > 16 and self._live * 4 * self.points_per_cell < len(self.cells):
+            self._build(np.flatnonzero(self._alive))
+
+    def _ring(self, ix, iy, r):
+        """
+        Cells at Chebyshev distance r from cell (ix, iy), clipped to the grid.
+        """
+        nx, ny, cells = self.nx, self.ny, self.cells
+        lo_x, hi_x = max(ix - r, 0), min(ix + r, nx - 1)
+        if r == 0:
+            if 0 <= ix < nx and 0 <= iy < ny:
+                yield cells[iy * nx + ix]
+            return
+        for j in (iy - r, iy + r):
+            if 0 <= j < ny:
+                for i in range(lo_x, hi_x + 1):
+                    yield cells[j * nx + i]
+        for i in (ix - r, ix + r):
+            if 0 <= i < nx:
+                for j in range(max(iy - r + 1, 0), min(iy + r - 1, ny - 1) + 1):
+                    yield cells[j * nx + i]
+
+    def iter_nearest(self, x, y):
+        """
+        Yield (distance, key) for every live point in increasing distance order,
+        ties broken by key. The index must not be modified while iterating.
+        """
+        cell = self.cell
+        ix = math.floor((x - self.x0) / cell)
+        iy = math.floor((y - self.y0) / cell)
+        xy = self._xy
+        heap = []
+        pushed = 0
+        # rings closer than the nearest grid cell are empty: a query far outside
+        # the grid starts at the ring that reaches it
+        r = max(ix - (self.nx - 1), -ix, iy - (self.ny - 1), -iy, 0)
+        while True:
+            if pushed < self._live:
+                for members in self._ring(ix, iy, r):
+                    for key in members:
+                        px, py = xy[key]
+                        heapq.heappush(heap, (math.hypot(px - x, py - y), key))
+                        pushed += 1
+                covers_grid = (ix - r <= 0 and iy - r <= 0
+                               and ix + r >= self.nx - 1 and iy + r >= self.ny - 1)
+                if pushed < self._live and not covers_grid:
+                    # every point not pushed yet lies outside the scanned block of cells;
+                    # the margin absorbs rounding in the cell assignment
+                    bound = min(x - (self.x0 + (ix - r) * cell),
+                                self.x0 + (ix + r + 1) * cell - x,
+                                y - (self.y0 + (iy - r) * cell),
+                                self.y0 + (iy + r + 1) * cell - y) - 1e-9 * cell
+                else:
+                    bound = math.inf
+                r += 1
+            else:
+                bound = math.inf
+            while heap and heap[0][0] <= bound:
+                yield heapq.heappop(heap)
+            if bound == math.inf:
+                return
+
+    def nearest(self, x, y, k=1):
+        """
+        The k nearest live points as a list of (distance, key), closest first.
+        """
+        result = []
+        for item in self.iter_nearest(x, y):
+            result.append(item)
+            if len(result) == k:
+                break
+        return result
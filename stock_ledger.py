@@ -0,0 +1,105 @@
+import multiprocessing
+from contextlib import nullcontext
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class StockLedger:
+    """
+    Goods in stock and storage capacity per warehouse and good type, shared by
+    all routes of a plan. Vehicles take goods out when they load and put goods
+    back (pickups, undelivered goods) when they unload, so stock never goes
+    below zero or above storage as long as every move is checked first.
+
+    stock:   (W, G) float64 goods available to load, np.inf for no limit
+    storage: (W, G) float64 most goods a warehouse can hold, np.inf for no limit
+    lock:    held around every check-and-move; a process lock once shared
+    """
+
+    def __init__(self, stock, storage, lock=None):
+        self.stock = np.array(stock, dtype=np.float64)
+        self.storage = np.array(storage, dtype=np.float64)
+        self.initial = self.stock.copy()
+        self.lock = lock if lock is not None else nullcontext()
+        over = self.stock > self.storage
+        if over.any():
+            w, g = np.argwhere(over)[0]
+            raise ValueError(f"warehouse position {w} holds {self.stock[w, g]} of good {g}, "
+                             f"more than its storage {self.storage[w, g]}")
+
+    @classmethod
+    def from_warehouses(cls, warehouses, good_types):
+        """
+        Ledger of the optional 'stock' and 'storage' dicts {good: amount} of the
+        warehouse records. Storage is unlimited where not given. A warehouse with
+        a 'stock' dict has none of the goods it leaves out; one without starts
+        full, with as much of every good as its storage holds (unlimited goods
+        where storage is unlimited).
+        Returns None when no warehouse gives either.
+        """
+        if not any("stock" in wh or "storage" in wh for wh in warehouses):
+            return None
+        shape = (len(warehouses), len(good_types))
+        stock = np.full(shape, np.inf)
+        storage = np.full(shape, np.inf)
+        for w, wh in enumerate(warehouses):
+            if "storage" in wh:
+                storage[w] = [wh["storage"].get(g, np.inf) for g in good_types]
+            stock[w] = [wh["stock"].get(g, 0.0) for g in good_types] if "stock" in wh else storage[w]
+        return cls(stock, storage)
+
+    def reset(self):
+        """
+        Back to the stock the ledger was created with.
+        """
+        self.stock[...] = self.initial
+
+    def move(self, w, unloaded=None, loaded=None):
+        """
+        Book goods unloaded into and loaded out of warehouse position w.
+        Callers check stock and space first, under self.lock.
+        """
+        if unloaded is not None:
+            self.stock[w] += unloaded
+        if loaded is not None:
+            self.stock[w] -= loaded
+
+    def share(self):
+        """
+        Move the stock into shared memory, guarded by a process lock, so route
+        building in other processes books against the same ledger.
+        Returns (blocks, spec): pass `spec` to StockLedger.attach() in the other
+        processes and `blocks` to release() when they are done.
+        """
+        shm = shared_memory.SharedMemory(create=True, size=max(self.stock.nbytes, 1))
+        shared = np.ndarray(self.stock.shape, dtype=np.float64, buffer=shm.buf)
+        shared[...] = self.stock
+        self.stock = shared
+        self.lock = multiprocessing.Lock()
+        return [shm], {"name": shm.name, "storage": self.storage, "initial": self.initial,
+                       "lock": self.lock}
+
+    @classmethod
+    def attach(cls, spec):
+        """
+        Map a ledger published with share().
+        Returns (ledger, blocks); `blocks` must outlive the ledger.
+        """
+        shm = shared_memory.SharedMemory(name=spec["name"])
+        ledger = cls.__new__(cls)
+        ledger.storage = spec["storage"]
+        ledger.initial = spec["initial"]
+        ledger.stock = np.ndarray(ledger.storage.shape, dtype=np.float64, buffer=shm.buf)
+        ledger.lock = spec["lock"]
+        return ledger, [shm]
+
+    def release(self, blocks):
+        """
+        Undo share(): copy the stock back into private memory and free the shared block.
+        """
+        self.stock = self.stock.copy()
+        self.lock = nullcontext()
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
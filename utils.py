@@ -1,5 +1,83 @@
 import json
 
+import numpy as np
 
-def to_json(data: dict) -> str:
-    return json.dumps(data, indent=2, ensure_ascii=False)
+# route points serialised per write, bounding the size of each intermediate string
+_POINTS_PER_WRITE = 65536
+
+
+def _json_default(obj):
+    """
+    json fallback for NumPy values: scalars become Python numbers, arrays lists.
+    """
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def to_json(data: dict, compact: bool = False) -> str:
+    if compact:
+        return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=_json_default)
+    return json.dumps(data, indent=2, ensure_ascii=False, default=_json_default)
+
+
+def _write_points(f, route) -> None:
+    """
+    Write a route as a JSON array of [x, y] pairs. The whole route is converted
+    to float64 in one NumPy call, then written in bounded slices.
+    """
+    points = np.asarray(route, dtype=np.float64).reshape(-1, 2)
+    f.write("[")
+    for start in range(0, len(points), _POINTS_PER_WRITE):
+        if start:
+            f.write(",")
+        chunk = json.dumps(points[start:start + _POINTS_PER_WRITE].tolist(), separators=(",", ":"))
+        f.write(chunk[1:-1])
+    f.write("]")
+
+
+def write_solution(solution: dict, f, fmt: str = "ndjson") -> None:
+    """
+    Stream a solution {vehicle_id: [(x, y), ...]} to an open text file, one
+    vehicle at a time, without building the whole document in memory.
+
+    fmt: "ndjson" - one line per vehicle: {"vehicle": id, "route": [[x, y], ...]}
+         "json"   - a single compact object {"<vehicle_id>": [[x, y], ...], ...}
+    """
+    if fmt == "ndjson":
+        for vid, route in solution.items():
+            f.write('{"vehicle":')
+            f.write(json.dumps(vid, default=_json_default))
+            f.write(',"route":')
+            _write_points(f, route)
+            f.write("}\n")
+    elif fmt == "json":
+        f.write("{")
+        for i, (vid, route) in enumerate(solution.items()):
+            if i:
+                f.write(",")
+            f.write(json.dumps(str(vid)))
+            f.write(":")
+            _write_points(f, route)
+        f.write("}\n")
+    else:
+        raise ValueError(f"unknown solution format {fmt!r}, expected 'ndjson' or 'json'")
+
+
+def read_solution(f, fmt: str = "ndjson") -> dict:
+    """
+    Inverse of write_solution: {vehicle_id: [(x, y), ...]}.
+    Vehicle IDs of the "json" format come back as strings (JSON object keys).
+    """
+    if fmt == "ndjson":
+        solution = {}
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                solution[record["vehicle"]] = [tuple(p) for p in record["route"]]
+        return solution
+    if fmt == "json":
+        return {vid: [tuple(p) for p in route] for vid, route in json.load(f).items()}
+    raise ValueError(f"unknown solution format {fmt!r}, expected 'ndjson' or 'json'")
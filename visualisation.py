@@ -1,34 +1,82 @@
+import math
+
 import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+
+# above these sizes the per-vehicle legend and the stop markers are left out
+MAX_LEGEND_VEHICLES = 20
+MAX_MARKERS = 5000
 
-def plot_solution(warehouses, vehicles, solution):
+
+def plot_solution(warehouses, vehicles, solution, path=None, max_points=200_000, dpi=150):
     """
     warehouses: list of {'id': int, 'x': float, 'y': float}
     vehicles:   list of {'id': int, 'warehouse_id': int, 'capacity': float, 'type': str}
     solution:   dict {vehicle_id: [(x,y), ...], ...}
+    path:       if given, render headless to this file (format from the extension,
+                e.g. .png or .svg) instead of opening a window
+    max_points: routes with more points in total are decimated to about this many
+    dpi:        resolution of raster output
+
+    All routes are drawn as one LineCollection. Large plots are rasterized inside
+    vector output so SVG files stay small.
     """
+    vehicle_by_id = {v["id"]: v for v in vehicles}
+    warehouse_by_id = {w["id"]: w for w in warehouses}
+
+    total_points = sum(len(route) + 2 for route in solution.values())
+    step = max(1, math.ceil(total_points / max_points))
+    paths = []
+    labels = []
+    n_markers = 0
     for vid, route in solution.items():
-        path_x, path_y = [], []
-        vehicle = next(v for v in vehicles if v["id"] == vid)
-        wh = next(w for w in warehouses if w["id"] == vehicle["warehouse_id"])
+        vehicle = vehicle_by_id[vid]
+        wh = warehouse_by_id[vehicle["warehouse_id"]]
+        home = np.array([[wh["x"], wh["y"]]], dtype=np.float64)
+        xy = np.vstack((home, np.asarray(route, dtype=np.float64).reshape(-1, 2), home))
+        if step > 1:
+            # keep every step-th point and the final one
+            xy = np.vstack((xy[:-1:step], xy[-1:]))
+        paths.append(xy)
+        n_markers += len(xy)
+        labels.append(f"Vehicle {vid} ({vehicle['type']}, cap: {vehicle['capacity']:.0f})")
 
-        path_x.append(wh["x"])
-        path_y.append(wh["y"])
-        for (x, y) in route:
-            path_x.append(x)
-            path_y.append(y)
-        path_x.append(wh["x"])
-        path_y.append(wh["y"])
+    if path is None:
+        fig = plt.figure()
+    else:
+        # a bare Figure renders without pyplot state or a display
+        fig = Figure()
+    ax = fig.add_subplot()
 
-        label = f"Vehicle {vid} ({vehicle['type']}, cap: {vehicle['capacity']:.0f})"
-        plt.plot(path_x, path_y, marker="o", label=label)
+    large = step > 1 or n_markers > MAX_MARKERS
+    cmap = plt.get_cmap("tab20")
+    colors = [cmap(i % cmap.N) for i in range(len(paths))]
+    ax.add_collection(LineCollection(paths, colors=colors, linewidths=0.5 if large else 1.5,
+                                     rasterized=large))
+    if not large and paths:
+        stops = np.vstack(paths)
+        stop_colors = np.repeat(np.arange(len(paths)), [len(xy) for xy in paths])
+        ax.scatter(stops[:, 0], stops[:, 1], s=12, c=np.asarray(colors)[stop_colors], zorder=2)
 
     wh_x = [w["x"] for w in warehouses]
     wh_y = [w["y"] for w in warehouses]
-    plt.scatter(wh_x, wh_y, marker="*", s=150, c="k", label="Warehouses")
-
-    plt.xlabel("X coordinate")
-    plt.ylabel("Y coordinate")
-    plt.title("Vehicle Routes (by type)")
-    plt.legend()
-    plt.grid(True)
-    plt.show()
+    ax.scatter(wh_x, wh_y, marker="*", s=150, c="k", label="Warehouses", zorder=3)
+    ax.autoscale_view()
+
+    handles = []
+    if len(paths) <= MAX_LEGEND_VEHICLES:
+        handles = [Line2D([], [], color=color, marker=None if large else "o", label=label)
+                   for color, label in zip(colors, labels)]
+    ax.set_xlabel("X coordinate")
+    ax.set_ylabel("Y coordinate")
+    ax.set_title("Vehicle Routes (by type)")
+    ax.legend(handles=handles + ax.get_legend_handles_labels()[0])
+    ax.grid(True)
+
+    if path is None:
+        plt.show()
+    else:
+        fig.savefig(path, dpi=dpi)